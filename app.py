@@ -1,7 +1,11 @@
 import os
 import logging
+from datetime import datetime
+from functools import lru_cache
+import pytz
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
@@ -31,7 +35,18 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # Keep a fixed set of server connections open for reuse across requests,
+    # with a bounded overflow for bursts. The limits apply per worker, so the
+    # defaults stay well under a small server's max_connections
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+        pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    )
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+# Record UndoAction rows for reversible changes; set UNDO_LOGGING=0 to skip
+# them during high-volume imports
+app.config["UNDO_LOGGING"] = os.environ.get("UNDO_LOGGING", "1") != "0"
 
 # initialize the app with the extension
 db.init_app(app)
@@ -42,30 +57,25 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 # Register Jinja filters
+# The timezone is built once at import; the filters are memoized because list
+# pages format the same handful of timestamps and dates on many rows.
+GMT_PLUS_4 = pytz.timezone('Asia/Dubai')  # GMT+4
+
+@lru_cache(maxsize=4096)
 def datetime_gmt4_filter(dt):
     """Convert datetime to GMT+4 and format as DD/MM/YYYY HH:MM"""
     if not dt:
         return ''
-    from pytz import timezone
-    import pytz
-    
-    GMT_PLUS_4 = timezone('Asia/Dubai')  # GMT+4
-    
     if dt.tzinfo is None:
         dt = pytz.utc.localize(dt)
     local_dt = dt.astimezone(GMT_PLUS_4)
     return local_dt.strftime('%d/%m/%Y %H:%M')
 
+@lru_cache(maxsize=4096)
 def date_gmt4_filter(dt):
     """Convert date to GMT+4 and format as MM/YY"""
     if not dt:
         return ''
-    from datetime import datetime
-    from pytz import timezone
-    import pytz
-    
-    GMT_PLUS_4 = timezone('Asia/Dubai')  # GMT+4
-    
     if isinstance(dt, datetime):
         if dt.tzinfo is None:
             dt = pytz.utc.localize(dt)
@@ -84,8 +94,51 @@ with app.app_context():
     import models  # noqa: F401
     import routes  # noqa: F401
     
+    # SQLite: WAL lets readers carry on while a request writes, NORMAL sync
+    # skips the fsync on every commit (WAL stays consistent on power loss),
+    # and busy_timeout waits for the write lock instead of failing with
+    # "database is locked"
+    if db.engine.dialect.name == 'sqlite':
+        @event.listens_for(db.engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA busy_timeout=5000')
+            cursor.close()
+    
+    # Trigram indexes on PostgreSQL need the pg_trgm extension
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            conn.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    
     db.create_all()
     
+    # create_all() doesn't add columns to existing tables either. Every
+    # gunicorn worker runs this at boot, so a worker that loses the race to
+    # add the column must not fail on it: PostgreSQL skips it with IF NOT
+    # EXISTS, and SQLite's duplicate column error is ignored
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import OperationalError
+    if 'version_id' not in {column['name'] for column in inspect(db.engine).get_columns('item')}:
+        if_not_exists = 'IF NOT EXISTS ' if db.engine.dialect.name == 'postgresql' else ''
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f'ALTER TABLE item ADD COLUMN {if_not_exists}version_id INTEGER NOT NULL DEFAULT 1'))
+        except OperationalError as e:
+            if 'duplicate column' not in str(e).lower():
+                raise
+    
+    # create_all() skips indexes on tables that already exist, so add any new ones
+    from sqlalchemy.schema import CreateIndex
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                dialects = index.info.get('dialects')
+                if dialects and conn.dialect.name not in dialects:
+                    continue
+                conn.execute(CreateIndex(index, if_not_exists=True))
+    
     # Initialize default item types
     from models import init_default_types
     init_default_types()
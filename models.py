@@ -1,6 +1,9 @@
+import threading
+from functools import lru_cache
 from datetime import datetime, date, timedelta
 from app import db
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import hybrid_property
 import pytz
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -8,6 +11,17 @@ from werkzeug.security import generate_password_hash, check_password_hash
 # GMT+4 timezone
 GMT_PLUS_4 = pytz.timezone('Asia/Dubai')
 
+def postgresql_index(*args, **kwargs):
+    """An index that is only created on PostgreSQL, e.g. pg_trgm GIN indexes"""
+    return db.Index(*args, info={'dialects': ('postgresql',)}, **kwargs).ddl_if(dialect='postgresql')
+
+def name_tsvector(column):
+    """to_tsvector over a name column, spelled identically in indexes and queries
+
+    Uses the 'simple' configuration: product names shouldn't be stemmed.
+    """
+    return func.to_tsvector(db.literal_column("'simple'"), column)
+
 # User model for authentication
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -28,6 +42,7 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@lru_cache(maxsize=4096)
 def format_datetime_gmt4(dt):
     """Convert datetime to GMT+4 and format as DD/MM/YYYY HH:MM"""
     if not dt:
@@ -37,6 +52,7 @@ def format_datetime_gmt4(dt):
     local_dt = dt.astimezone(GMT_PLUS_4)
     return local_dt.strftime('%d/%m/%Y %H:%M')
 
+@lru_cache(maxsize=4096)
 def format_date_gmt4(dt):
     """Convert date to GMT+4 and format as MM/YY"""
     if not dt:
@@ -78,6 +94,12 @@ class Product(db.Model):
     # Relationship to items (batches)
     items = db.relationship('Item', backref='product', lazy=True)
     
+    # Trigram index so the inventory search's ILIKE '%q%' is an index scan on PostgreSQL
+    __table_args__ = (
+        postgresql_index('ix_product_name_trgm', 'name',
+                         postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+    
     def __repr__(self):
         return f'<Product {self.name}>'
     
@@ -117,6 +139,42 @@ class Item(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Bumped on every update; a flush whose row changed underneath it raises
+    # StaleDataError instead of overwriting the other write
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version_id}
+    
+    __table_args__ = (
+        # Partial index so list views only join active (quantity > 0) rows against Bag
+        db.Index('ix_item_active_bag', 'bag_id',
+                 postgresql_where=db.text('quantity > 0'),
+                 sqlite_where=db.text('quantity > 0')),
+        # Per-product quantity index for the low-stock SUM(quantity) GROUP BY
+        db.Index('ix_item_product_qty', 'product_id', 'quantity'),
+        # Bag totals (SUM(quantity) GROUP BY bag_id) read only the index
+        db.Index('ix_item_bag_qty', 'bag_id', 'quantity'),
+        # Case-insensitive prefix index so autocomplete can seek on lower(name) LIKE 'q%'
+        db.Index('ix_item_name_lower', func.lower(name).label('name_lower'),
+                 postgresql_ops={'name_lower': 'varchar_pattern_ops'}),
+        # Partial expiry index for the expired / expiring range scans ordered by expiry_date
+        db.Index('ix_item_active_expiry', 'expiry_date',
+                 postgresql_where=db.text('quantity > 0'),
+                 sqlite_where=db.text('quantity > 0')),
+        # Trigram index for the autocomplete / inventory search ILIKE '%q%' on PostgreSQL
+        postgresql_index('ix_item_name_trgm', 'name',
+                         postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Trigram index for the inventory search's generic_name ILIKE '%q%' on PostgreSQL
+        postgresql_index('ix_item_generic_name_trgm', 'generic_name',
+                         postgresql_using='gin', postgresql_ops={'generic_name': 'gin_trgm_ops'}),
+        # Name/type/size lookups: audit counts and the "identical item" merge checks
+        db.Index('ix_item_name_type_size', 'name', 'type', 'size'),
+        # Exact "same item in this bag" match used by transfers, restocks and undo
+        db.Index('ix_item_bag_match', 'bag_id', 'name', 'type', 'size', 'brand', 'expiry_date'),
+        # Full-text index for word-prefix name matching on PostgreSQL
+        postgresql_index('ix_item_name_fts', name_tsvector(name), postgresql_using='gin'),
+    )
+    
     def __repr__(self):
         return f'<Item {self.name} ({self.quantity})>'
     
@@ -172,6 +230,22 @@ class MovementHistory(db.Model):
     # Relationship
     user = db.relationship('User', backref='movements')
     
+    __table_args__ = (
+        # Supports newest-first listing and keyset pagination on (timestamp, id)
+        db.Index('ix_mh_ts', 'timestamp', 'id'),
+        # Per-item history: equality on item_name, newest first
+        db.Index('ix_mh_item_name_ts', 'item_name', 'timestamp'),
+        # Individual item history: equality on item_name and item_type, newest first
+        db.Index('ix_mh_name_type_ts', 'item_name', 'item_type', 'timestamp'),
+        # History type filter and recent wastage: equality on movement_type, newest first
+        db.Index('ix_mh_type_ts', 'movement_type', 'timestamp', 'id'),
+        # Trigram index for the autocomplete / history ILIKE '%q%' name match on PostgreSQL
+        postgresql_index('ix_mh_item_name_trgm', 'item_name',
+                         postgresql_using='gin', postgresql_ops={'item_name': 'gin_trgm_ops'}),
+        # Full-text index for word-prefix name matching on PostgreSQL
+        postgresql_index('ix_mh_item_name_fts', name_tsvector(item_name), postgresql_using='gin'),
+    )
+    
     def __repr__(self):
         return f'<Movement {self.item_name} ({self.quantity}) - {self.movement_type}>'
 
@@ -201,20 +275,27 @@ class BagMinimum(db.Model):
     def __repr__(self):
         return f'<BagMinimum {self.bag.name} - {self.product.name}: {self.minimum_quantity}>'
     
+    @hybrid_property
     def current_quantity(self):
         """Get current quantity of this product in this bag"""
-        total = 0
-        for item in Item.query.filter_by(bag_id=self.bag_id, product_id=self.product_id).all():
-            total += item.quantity
-        return total
+        return db.session.scalar(select(func.coalesce(func.sum(Item.quantity), 0)).where(
+            Item.bag_id == self.bag_id, Item.product_id == self.product_id
+        ))
+    
+    @current_quantity.expression
+    def current_quantity(cls):
+        """Correlated SUM, so queries can select or filter on it alongside the minimum"""
+        return select(func.coalesce(func.sum(Item.quantity), 0)).where(
+            Item.bag_id == cls.bag_id, Item.product_id == cls.product_id
+        ).scalar_subquery()
     
     def is_below_minimum(self):
         """Check if current quantity is below minimum"""
-        return self.current_quantity() < self.minimum_quantity
+        return self.current_quantity < self.minimum_quantity
     
     def shortage_amount(self):
         """Calculate how many items are needed to reach minimum"""
-        current = self.current_quantity()
+        current = self.current_quantity
         if current < self.minimum_quantity:
             return self.minimum_quantity - current
         return 0
@@ -248,29 +329,43 @@ class PermanentDeletion(db.Model):
     def __repr__(self):
         return f'<PermanentDeletion {self.entity_type}: {self.entity_name}>'
 
+# Default types only need seeding once per process
+_defaults_initialized = False
+_defaults_lock = threading.Lock()
+
 # Initialize default item types - Updated for simplified system
 def init_default_types():
-    default_types = [
-        'Medications/Vials',
-        'IV Fluids/Solutions', 
-        'Needles & Syringes',
-        'Consumable Dressings/Swabs',
-        'Catheters & Containers',
-        'Equipment/Waste'
-    ]
-    
-    for type_name in default_types:
-        if not ItemType.query.filter_by(name=type_name).first():
-            item_type = ItemType(name=type_name)
-            db.session.add(item_type)
-    
-    # Update existing items to type 1 if they have old types
-    existing_items = Item.query.all()
-    for item in existing_items:
-        if item.type not in default_types:
-            item.type = 'Medications/Vials'  # Default to type 1
-    
-    db.session.commit()
+    global _defaults_initialized
+    if _defaults_initialized:
+        return
+    
+    with _defaults_lock:
+        if _defaults_initialized:
+            return
+        
+        default_types = [
+            'Medications/Vials',
+            'IV Fluids/Solutions', 
+            'Needles & Syringes',
+            'Consumable Dressings/Swabs',
+            'Catheters & Containers',
+            'Equipment/Waste'
+        ]
+        
+        existing_types = {name for (name,) in db.session.query(ItemType.name).all()}
+        for type_name in default_types:
+            if type_name not in existing_types:
+                item_type = ItemType(name=type_name)
+                db.session.add(item_type)
+        
+        # Update existing items to type 1 if they have old types
+        Item.query.filter(Item.type.notin_(default_types)).update(
+            {'type': 'Medications/Vials'},  # Default to type 1
+            synchronize_session=False
+        )
+        
+        db.session.commit()
+        _defaults_initialized = True
 
 class InventoryAudit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1,15 +1,136 @@
 import os
 import csv
 import io
+import codecs
 from datetime import datetime, date, timedelta
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, abort, g
 from werkzeug.utils import secure_filename
-from sqlalchemy import or_, and_, func
+from werkzeug.exceptions import NotFound
+from sqlalchemy import or_, and_, func, select, update, delete, event, tuple_, literal, lambda_stmt, case, null
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload, joinedload, contains_eager, load_only, aliased
+from sqlalchemy.orm.exc import StaleDataError
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
-from models import Item, Bag, MovementHistory, ItemType, Product, User, BagMinimum, UndoAction, PermanentDeletion, InventoryAudit, init_default_types, format_datetime_gmt4, format_date_gmt4, GMT_PLUS_4
+from models import Item, Bag, MovementHistory, ItemType, Product, User, BagMinimum, UndoAction, PermanentDeletion, InventoryAudit, format_datetime_gmt4, format_date_gmt4, GMT_PLUS_4, name_tsvector
 import json
-from functools import wraps
+import logging
+import re
+import time
+from functools import wraps, lru_cache
+from itertools import groupby, zip_longest
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to Flask's stdlib encoder
+    orjson = None
+
+try:
+    import chardet
+except ImportError:  # chardet is optional; non-UTF-8 uploads fall back to cp1252
+    chardet = None
+
+def fast_jsonify(obj):
+    """jsonify() for hot endpoints - serializes with orjson when it is installed"""
+    if orjson is None:
+        return jsonify(obj)
+    return app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+def dumps_json(obj):
+    """json.dumps() for stored undo/deletion payloads - uses orjson when it is
+    installed (int dict keys are stringified the same way json does)"""
+    if orjson is None:
+        return json.dumps(obj)
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def loads_json(text):
+    """json.loads() for stored undo/deletion payloads - uses orjson when it is installed"""
+    if orjson is None:
+        return json.loads(text)
+    return orjson.loads(text)
+
+# Rows per bulk write when importing CSV files
+CSV_WRITE_CHUNK = 1000
+
+# Longest autocomplete query that is matched against item names
+MAX_SEARCH_QUERY_LENGTH = 64
+
+# Dialect-specific INSERT constructs that support ON CONFLICT ... DO UPDATE
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def detect_csv_encoding(stream, sample_size=4096):
+    """Guess the text encoding of an uploaded CSV from its first few KB
+
+    UTF-8 (with or without a BOM) is assumed whenever the sample decodes as
+    such; Excel exports in legacy code pages are detected with chardet when it
+    is installed. The stream is rewound before returning.
+    """
+    sample = stream.read(sample_size)
+    stream.seek(0)
+    try:
+        # A multi-byte character cut off at the sample boundary isn't an error
+        # unless the sample is the whole file
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=len(sample) < sample_size)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        pass
+    if chardet is not None:
+        detected = chardet.detect(sample).get('encoding')
+        if detected:
+            return detected
+    return 'cp1252'
+
+def chunked(rows, size=CSV_WRITE_CHUNK):
+    """Yield successive slices of at most size rows"""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+# Expiry dates arrive as MM/YY (e.g. "04/26") or YYYY-MM (HTML month input)
+MM_YY_RE = re.compile(r'^(\d{1,2})/(\d{2})$')
+YYYY_MM_RE = re.compile(r'^(\d{4})-(\d{1,2})$')
+
+# Multi-transfer form fields, named items[<key>][item_id] / items[<key>][quantity]
+TRANSFER_FIELD_RE = re.compile(r'^items\[([^\]]+)\]\[(item_id|quantity)\]$')
+
+# Inventory audit form fields, named <field>_<row>, e.g. new_count_3 / current_qty_3
+AUDIT_FIELD_RE = re.compile(r'^(new_count|current_qty|item_name|item_type|item_size)_(.+)$')
+
+# Per-row failures listed in a batch's summary flash before "(+N more)"
+MAX_FLASHED_ERRORS = 10
+
+# Most recent movements shown on an individual item's history page
+ITEM_HISTORY_LIMIT = 500
+
+# Columns the inline product / item editors may change. Name and type are
+# kept in sync between a product and its items; empty optional item fields
+# are stored as NULL
+PRODUCT_EDIT_FIELDS = frozenset({'name', 'type', 'minimum_stock'})
+ITEM_EDIT_FIELDS = frozenset({'name', 'type', 'size', 'brand', 'generic_name', 'expiry_date'})
+ITEM_OPTIONAL_FIELDS = frozenset({'size', 'brand', 'generic_name'})
+PRODUCT_SHARED_FIELDS = frozenset({'name', 'type'})
+
+# Largest edit list /api/update-items applies, all in one transaction
+MAX_BATCH_ITEM_EDITS = 500
+
+@lru_cache(maxsize=512)
+def parse_expiry_date(date_str):
+    """Parse an MM/YY or YYYY-MM expiry string to the 1st of that month
+
+    Cached because uploads repeat the same handful of expiry strings on many rows.
+    """
+    match = MM_YY_RE.match(date_str)
+    if match:
+        month, year = int(match.group(1)), int(match.group(2))
+        # Convert 2-digit year to 4-digit (assume 20XX)
+        year = 2000 + year if year < 50 else 1900 + year
+    else:
+        match = YYYY_MM_RE.match(date_str)
+        if not match:
+            raise ValueError(f"Unrecognised expiry date: {date_str}")
+        year, month = int(match.group(1)), int(match.group(2))
+    return date(year, month, 1)
 
 # Admin required decorator
 def admin_required(f):
@@ -21,6 +142,280 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Small in-process TTL cache for rarely-changing dropdown data. Values are plain
+# row tuples rather than ORM objects so they stay valid across sessions.
+FORM_CACHE_TTL = 30  # seconds
+FORM_CACHE_MAX_ENTRIES = 1024
+LAST_ACTION_CACHE_TTL = 5  # seconds; other workers only see new actions on expiry
+_form_cache = {}
+
+def cached_form_data(key, loader, ttl=FORM_CACHE_TTL):
+    """Return loader() cached under key for ttl seconds"""
+    now = time.monotonic()
+    entry = _form_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    value = loader()
+    if key not in _form_cache and len(_form_cache) >= FORM_CACHE_MAX_ENTRIES:
+        # Per-name entries can pile up; drop expired ones, then the oldest.
+        # Scan a snapshot, since other threads may add or evict entries meanwhile
+        for stale_key in [k for k, (expires, _) in list(_form_cache.items()) if expires <= now]:
+            _form_cache.pop(stale_key, None)
+        if len(_form_cache) >= FORM_CACHE_MAX_ENTRIES:
+            _form_cache.pop(next(iter(_form_cache), None), None)
+    _form_cache[key] = (now + ttl, value)
+    return value
+
+def gmt4_today():
+    """Today's date in GMT+4, worked out once per request"""
+    if 'gmt4_today' not in g:
+        g.gmt4_today = datetime.now(GMT_PLUS_4).date()
+    return g.gmt4_today
+
+def get_cabinet():
+    """The default Cabinet storage location (or None), looked up once per request"""
+    if 'cabinet' not in g:
+        g.cabinet = Bag.query.filter_by(name='Cabinet').first()
+    return g.cabinet
+
+def invalidate_form_cache(*keys):
+    """Drop cached entries so the next read reloads them"""
+    for key in keys:
+        _form_cache.pop(key, None)
+
+def cached_bags():
+    """All storage locations as (id, name, location, description) rows for form dropdowns"""
+    return cached_form_data('bags', lambda: db.session.query(
+        Bag.id, Bag.name, Bag.location, Bag.description
+    ).order_by(Bag.id).all())
+
+def cached_item_types():
+    """All item types as (id, name) rows for form dropdowns"""
+    return cached_form_data('item_types', lambda: db.session.query(
+        ItemType.id, ItemType.name
+    ).order_by(ItemType.id).all())
+
+def expiry_buckets(today):
+    """In-stock items that are expired, expiring within 30 days and within 31-90 days
+
+    Returns three lists of (id, name, type, size, quantity, expiry_date, bag_name)
+    rows ordered by expiry date. Shared by the dashboard, expiry and wastage pages
+    and cached briefly per day, since those pages are reloaded far more often
+    than stock changes.
+    """
+    def load():
+        thirty_days = today + timedelta(days=30)
+        ninety_days = today + timedelta(days=90)
+        # One range scan over everything expiring within 90 days (or already
+        # expired), split into buckets in Python. Built as a lambda_stmt so
+        # only the date is re-bound on each reload
+        rows = db.session.execute(lambda_stmt(
+            lambda: select(
+                Item.id, Item.name, Item.type, Item.size, Item.quantity,
+                Item.expiry_date, Bag.name.label('bag_name')
+            ).join(Bag, Item.bag_id == Bag.id).where(and_(
+                Item.expiry_date.isnot(None),
+                Item.expiry_date <= ninety_days,
+                Item.quantity > 0
+            )).order_by(Item.expiry_date)
+        )).all()
+        
+        expired = [row for row in rows if row.expiry_date < today]
+        expiring = [row for row in rows if today <= row.expiry_date <= thirty_days]
+        expiring_90_days = [row for row in rows if row.expiry_date > thirty_days]
+        
+        return expired, expiring, expiring_90_days
+    return cached_form_data(('expiry', today), load)
+
+def like_escape(text):
+    """text with the LIKE wildcards % and _ (and the escape character itself)
+    backslash-escaped, for use with ilike(..., escape='\\')
+
+    Keeps user input from turning a selective pattern into a match-everything
+    scan.
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def name_matches(column, query):
+    """column ILIKE '%query%', widened on PostgreSQL to also match names whose
+    words start with each word of query (e.g. "gau 5c" finds "Gauze 5cm")
+
+    Both halves are served by GIN indexes (pg_trgm and to_tsvector), so the OR
+    is a bitmap-or of two index scans rather than a sequential scan.
+    """
+    condition = column.ilike(f'%{like_escape(query)}%', escape='\\')
+    words = re.findall(r'\w+', query)
+    if words and db.engine.dialect.name == 'postgresql':
+        prefix_query = ' & '.join(f'{word}:*' for word in words)
+        condition = or_(condition, name_tsvector(column).op('@@')(
+            func.to_tsquery(db.literal_column("'simple'"), prefix_query)
+        ))
+    return condition
+
+def cached_product_by_name(name):
+    """(id, type, minimum_stock) row of the product called name, or None
+
+    Cached because the add-items form probes the same names on every keystroke.
+    """
+    # lambda_stmt caches the statement construction as well as its compiled
+    # SQL, so a cache miss costs little more than the query itself
+    return cached_form_data(('product', name), lambda: db.session.execute(lambda_stmt(
+        lambda: select(Product.id, Product.type, Product.minimum_stock).where(Product.name == name)
+    )).first())
+
+def dashboard_totals():
+    """(location_totals, unique_products, bag_stats) for the dashboard summary
+
+    location_totals maps 'cabinet'/'bag' to the summed quantity there and
+    bag_stats maps bag id -> (active quantity, active lines). Cached because
+    the dashboard is polled far more often than stock changes; any commit
+    clears it.
+    """
+    def load():
+        location_totals = dict(db.session.query(Bag.location, func.sum(Item.quantity)).select_from(Item).join(Bag).filter(
+            Bag.location.in_(('cabinet', 'bag'))
+        ).group_by(Bag.location).all())
+        unique_products = Product.query.count()
+        bag_stats = {bag_id: (total, unique) for bag_id, total, unique in db.session.query(
+            Item.bag_id, func.sum(Item.quantity), func.count(Item.id)
+        ).filter(Item.quantity > 0).group_by(Item.bag_id).all()}
+        return location_totals, unique_products, bag_stats
+    return cached_form_data(('dashboard', 'totals'), load)
+
+# Cache entries derived from stock, products, history or undo actions, keyed (kind, ...)
+COMMIT_INVALIDATED_CACHES = ('expiry', 'product', 'dashboard', 'autocomplete', 'last_action')
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_commit_caches(session):
+    """Any committed write may move stock in or out of the expiry buckets,
+    change the dashboard totals, create, rename or delete a product, add
+    a name that autocomplete should suggest or record or use an undo action"""
+    for key in [key for key in list(_form_cache)
+                if isinstance(key, tuple) and key[0] in COMMIT_INVALIDATED_CACHES]:
+        _form_cache.pop(key, None)
+
+def active_items_by_bag(bags):
+    """Map bag name -> in-stock items ordered by name, for bags that have any.
+
+    Fetches the items of all bags in one query instead of one per bag.
+    """
+    bag_names = {bag.id: bag.name for bag in bags}
+    if not bag_names:
+        return {}
+    
+    items = Item.query.filter(
+        Item.bag_id.in_(bag_names.keys()),
+        Item.quantity > 0
+    ).order_by(Item.bag_id, Item.name).all()
+    
+    items_by_bag_id = {bag_id: list(group) for bag_id, group in groupby(items, key=lambda item: item.bag_id)}
+    return {bag.name: items_by_bag_id[bag.id] for bag in bags if bag.id in items_by_bag_id}
+
+def bags_below_minimum(bags):
+    """[{'bag': bag, 'low_items': [...]}] for each of bags with products below their minimum
+
+    The current quantity of every minimum is summed in one GROUP BY instead of
+    several queries per minimum.
+    """
+    current_qty = func.coalesce(func.sum(Item.quantity), 0)
+    below_minimum_rows = db.session.query(BagMinimum, current_qty.label('current')).outerjoin(
+        Item, and_(Item.product_id == BagMinimum.product_id, Item.bag_id == BagMinimum.bag_id)
+    ).options(selectinload(BagMinimum.product)).group_by(BagMinimum.id).having(
+        current_qty < BagMinimum.minimum_quantity
+    ).order_by(BagMinimum.id).all()
+    below_minimum_by_bag = {}
+    for minimum, current in below_minimum_rows:
+        below_minimum_by_bag.setdefault(minimum.bag_id, []).append({
+            'product': minimum.product,
+            'current': current,
+            'minimum': minimum.minimum_quantity,
+            'shortage': minimum.minimum_quantity - current
+        })
+    
+    low_stock_bags = []
+    for bag in bags:
+        bag_low_items = below_minimum_by_bag.get(bag.id)
+        if bag_low_items:
+            low_stock_bags.append({
+                'bag': bag,
+                'low_items': bag_low_items
+            })
+    return low_stock_bags
+
+def record_undo(action_type, data, description):
+    """Add an UndoAction for the current user to the open transaction.
+
+    The row is written with the change it reverses, since the undo button
+    reads it back straight away. Skipped when UNDO_LOGGING is off, e.g. for
+    bulk scripts that will never be undone.
+    """
+    if not app.config['UNDO_LOGGING']:
+        return
+    db.session.add(UndoAction(
+        action_type=action_type,
+        action_data=dumps_json(data),
+        description=description,
+        user_id=current_user.id
+    ))
+
+def mark_deletion_restored(entity_type, entity_name):
+    """Flag the current user's unrestored PermanentDeletion of entity_name as
+    restored, with one UPDATE rather than loading the row first"""
+    match = select(PermanentDeletion.id).filter_by(
+        entity_type=entity_type,
+        entity_name=entity_name,
+        user_id=current_user.id,
+        is_restored=False
+    ).limit(1).scalar_subquery()
+    db.session.execute(
+        update(PermanentDeletion)
+        .where(PermanentDeletion.id == match)
+        .values(is_restored=True)
+        .execution_options(synchronize_session=False)
+    )
+
+def merge_into_bag(source, bag_id, quantity, match_product=False):
+    """Add quantity to the item matching source in bag_id, creating it if absent.
+
+    The match and increment run as one UPDATE ... RETURNING so the common
+    "already stocked" case is a single round trip and concurrent transfers
+    cannot lose an update. With match_product the destination must also share
+    source's product_id. Returns the id of the topped-up item, or None if a
+    new item was created.
+    """
+    criteria = dict(
+        name=source.name,
+        type=source.type,
+        size=source.size,
+        expiry_date=source.expiry_date,
+        brand=source.brand,
+        bag_id=bag_id
+    )
+    if match_product:
+        criteria['product_id'] = source.product_id
+    match = select(Item.id).filter_by(**criteria).limit(1).scalar_subquery()
+    
+    merged_id = db.session.execute(
+        update(Item)
+        .where(Item.id == match)
+        .values(quantity=Item.quantity + quantity, version_id=Item.version_id + 1)
+        .returning(Item.id)
+    ).scalar()
+    
+    if merged_id is None:
+        db.session.add(Item(
+            name=source.name,
+            type=source.type,
+            brand=source.brand,
+            size=source.size,
+            quantity=quantity,
+            expiry_date=source.expiry_date,
+            bag_id=bag_id,
+            product_id=source.product_id
+        ))
+    
+    return merged_id
+
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -53,53 +448,34 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Initialize default types if needed
-    init_default_types()
-    
     # Get cabinet and bag inventories separately
     cabinet = Bag.query.filter_by(location='cabinet').first()
     bags = Bag.query.filter_by(location='bag').all()
     
-    # Get summary statistics
-    cabinet_items = db.session.query(func.sum(Item.quantity)).join(Bag).filter(Bag.location == 'cabinet').scalar() or 0
-    bag_items = db.session.query(func.sum(Item.quantity)).join(Bag).filter(Bag.location == 'bag').scalar() or 0
+    # Get summary statistics - cabinet and bag totals from one scan grouped by
+    # location, unique products and per-bag counts, all briefly cached
+    location_totals, total_unique_items, bag_stats = dashboard_totals()
+    cabinet_items = location_totals.get('cabinet') or 0
+    bag_items = location_totals.get('bag') or 0
     total_items = cabinet_items + bag_items
     total_bags = len(bags)
     
-    # Count unique products
-    total_unique_items = Product.query.count()
-    
-    # Items expiring soon (within 30 days)
-    thirty_days_from_now = date.today() + timedelta(days=30)
-    expiring_items = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date <= thirty_days_from_now,
-            Item.expiry_date >= date.today(),
-            Item.quantity > 0
-        )
-    ).all()
-    
-    # Expired items
-    expired_items = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date < date.today(),
-            Item.quantity > 0
-        )
-    ).all()
+    # Expired items and items expiring soon (within 30 days)
+    expired_items, expiring_items, _ = expiry_buckets(date.today())
     
     # Low stock items (using product minimum stock thresholds)
-    low_stock_products = Product.query.filter(Product.minimum_stock > 0).all()
-    low_stock_items = []
-    for product in low_stock_products:
-        total_qty = sum(item.quantity for item in product.items if item.quantity > 0)
-        if total_qty <= product.minimum_stock:
-            low_stock_items.append({
-                'product': product,
-                'current_qty': total_qty,
-                'minimum_stock': product.minimum_stock
-            })
+    # Products whose active quantity is at or below their minimum, summed in one GROUP BY
+    active_qty = func.coalesce(func.sum(Item.quantity), 0)
+    low_stock_rows = db.session.query(Product, active_qty.label('qty')).outerjoin(
+        Item, and_(Item.product_id == Product.id, Item.quantity > 0)
+    ).filter(Product.minimum_stock > 0).group_by(Product.id).having(
+        active_qty <= Product.minimum_stock
+    ).all()
+    low_stock_items = [{
+        'product': product,
+        'current_qty': qty,
+        'minimum_stock': product.minimum_stock
+    } for product, qty in low_stock_rows]
     
     # Low stock items in cabinet (quantity <= 10) - for alerts section
     low_stock_cabinet = Item.query.join(Bag).filter(
@@ -110,45 +486,30 @@ def dashboard():
         )
     ).all()
     
-    # Empty bags
-    empty_bags = [bag for bag in bags if bag.get_total_items() == 0]
+    # Empty bags (bag_stats only has bags with active stock)
+    empty_bags = [bag for bag in bags if bag.id not in bag_stats]
     
     # Bags below minimum quantities
-    low_stock_bags = []
-    for bag in bags:
-        bag_low_items = []
-        for minimum in bag.minimums:
-            if minimum.is_below_minimum():
-                bag_low_items.append({
-                    'product': minimum.product,
-                    'current': minimum.current_quantity(),
-                    'minimum': minimum.minimum_quantity,
-                    'shortage': minimum.shortage_amount()
-                })
-        if bag_low_items:
-            low_stock_bags.append({
-                'bag': bag,
-                'low_items': bag_low_items
-            })
+    low_stock_bags = bags_below_minimum(bags)
     
     # Check for overdue inventory audits (over 7 days)
     seven_days_ago = datetime.now() - timedelta(days=7)
     last_audit = InventoryAudit.query.order_by(InventoryAudit.audit_date.desc()).first()
     audit_overdue = not last_audit or last_audit.audit_date < seven_days_ago
     
-    # Recent movements
-    recent_movements = MovementHistory.query.order_by(
-        MovementHistory.timestamp.desc()
+    # Recent movements (user joined in, newest-first walks ix_mh_ts backwards)
+    recent_movements = MovementHistory.query.options(joinedload(MovementHistory.user)).order_by(
+        MovementHistory.timestamp.desc(), MovementHistory.id.desc()
     ).limit(20).all()
     
     # Bag statistics
     bags_with_counts = []
     for bag in bags:
-        item_count = sum(item.quantity for item in bag.items if item.quantity > 0)
+        item_count, unique_items = bag_stats.get(bag.id, (0, 0))
         bags_with_counts.append({
             'name': bag.name,
             'count': item_count,
-            'unique_items': len([item for item in bag.items if item.quantity > 0])
+            'unique_items': unique_items
         })
     
     return render_template('dashboard.html',
@@ -181,64 +542,59 @@ def add_items():
             # Handle manual form submission
             return handle_manual_addition()
     
-    bags = Bag.query.all()
-    item_types = ItemType.query.all()
-    
-    # Get existing item names for autocomplete with more complete information
-    existing_items_query = db.session.query(
-        Item.name, 
-        Item.type, 
-        Item.brand, 
-        Item.size,
-        func.max(Item.expiry_date).label('latest_expiry'),
-        func.count(Item.id).label('frequency')
-    ).group_by(Item.name, Item.type, Item.brand, Item.size).all()
-    
-    history_items = db.session.query(
-        MovementHistory.item_name, 
+    bags = cached_bags()
+    item_types = cached_item_types()
+    
+    # Existing item names for autocomplete: current inventory and movement
+    # history in one UNION ALL, deduplicated and ranked by the outer GROUP BY.
+    # A name/type/brand/size that has item rows is reported from the inventory
+    # side only (its item count and latest expiry); otherwise it comes from
+    # history with its movement count.
+    brand = func.coalesce(Item.brand, '')
+    size = func.coalesce(Item.size, '')
+    suggestions = select(
+        Item.name.label('name'),
+        Item.type.label('type'),
+        brand.label('brand'),
+        size.label('size'),
+        Item.expiry_date.label('expiry_date'),
+        literal(0).label('source')
+    ).union_all(select(
+        MovementHistory.item_name,
         MovementHistory.item_type,
-        MovementHistory.item_size,
-        func.count(MovementHistory.id).label('frequency')
+        literal(''),
+        func.coalesce(MovementHistory.item_size, ''),
+        null(),
+        literal(1)
+    )).subquery()
+    source = func.min(suggestions.c.source)
+    frequency = case(
+        (source == 0, func.sum(case((suggestions.c.source == 0, 1), else_=0))),
+        else_=func.count()
+    )
+    rows = db.session.execute(select(
+        suggestions.c.name,
+        suggestions.c.type,
+        suggestions.c.brand,
+        suggestions.c.size,
+        func.max(suggestions.c.expiry_date).label('latest_expiry'),
+        frequency.label('frequency'),
+        source.label('source')
     ).group_by(
-        MovementHistory.item_name, 
-        MovementHistory.item_type, 
-        MovementHistory.item_size
-    ).all()
-    
-    # Combine and format items for autocomplete
-    autocomplete_items = []
-    seen = set()
-    
-    for item in existing_items_query:
-        key = (item.name, item.type, item.brand or '', item.size or '')
-        if key not in seen:
-            autocomplete_items.append({
-                'name': item.name,
-                'type': item.type,
-                'brand': item.brand or '',
-                'size': item.size or '',
-                'latest_expiry': item.latest_expiry.isoformat() if item.latest_expiry else None,
-                'frequency': item.frequency,
-                'source': 'current'
-            })
-            seen.add(key)
-    
-    for item in history_items:
-        key = (item.item_name, item.item_type, '', item.item_size or '')
-        if key not in seen:
-            autocomplete_items.append({
-                'name': item.item_name,
-                'type': item.item_type,
-                'brand': '',
-                'size': item.item_size or '',
-                'latest_expiry': None,
-                'frequency': item.frequency,
-                'source': 'history'
-            })
-            seen.add(key)
-    
-    # Sort by frequency (most used first) then by name
-    autocomplete_items.sort(key=lambda x: (-x['frequency'], x['name']))
+        suggestions.c.name, suggestions.c.type, suggestions.c.brand, suggestions.c.size
+    ).order_by(
+        frequency.desc(), suggestions.c.name, source
+    )).all()
+    
+    autocomplete_items = [{
+        'name': row.name,
+        'type': row.type,
+        'brand': row.brand,
+        'size': row.size,
+        'latest_expiry': row.latest_expiry.isoformat() if row.latest_expiry else None,
+        'frequency': row.frequency,
+        'source': 'current' if row.source == 0 else 'history'
+    } for row in rows]
     
     return render_template('add_items.html', bags=bags, item_types=item_types, autocomplete_items=autocomplete_items)
 
@@ -247,96 +603,153 @@ def handle_csv_upload(file):
         filename = secure_filename(file.filename)
         
         try:
-            # Read CSV file
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream)
+            # Decode the upload incrementally so rows are parsed as they are read
+            encoding = detect_csv_encoding(file.stream)
+            stream = io.TextIOWrapper(file.stream, encoding=encoding, newline='')
+            csv_input = csv.reader(stream)
+            
+            # Map header names to column positions once instead of building a dict per row
+            header = next(csv_input, [])
+            columns = {name.strip(): index for index, name in enumerate(header)}
+            
+            def field(row, name, default=''):
+                index = columns.get(name)
+                if index is None or index >= len(row):
+                    return default
+                return row[index]
             
-            items_added = 0
             errors = []
+            parsed_rows = []
             
+            # First pass: validate and parse every row without touching the database
             for row_num, row in enumerate(csv_input, start=2):
                 try:
                     # Validate required fields
-                    if not row.get('name') or not row.get('type') or not row.get('quantity'):
+                    if not field(row, 'name') or not field(row, 'type') or not field(row, 'quantity'):
                         errors.append(f"Row {row_num}: Missing required fields (name, type, quantity)")
                         continue
                     
-                    # Get or create bag
-                    bag_name = row.get('bag', 'Cabinet')
-                    bag = Bag.query.filter_by(name=bag_name).first()
-                    if not bag:
-                        bag = Bag(name=bag_name, description=f"Auto-created from CSV")
-                        db.session.add(bag)
-                        db.session.flush()
-                    
                     # Parse expiry date (MM/YY format, default to 1st of month)
                     expiry_date = None
-                    if row.get('expiry_date'):
+                    if field(row, 'expiry_date'):
                         try:
-                            date_str = row['expiry_date'].strip()
-                            if '/' in date_str:
-                                # New MM/YY format (e.g., "04/26")
-                                month, year = date_str.split('/')
-                                # Convert 2-digit year to 4-digit (assume 20XX)
-                                full_year = 2000 + int(year) if int(year) < 50 else 1900 + int(year)
-                                expiry_date = datetime(full_year, int(month), 1).date()
-                            else:
-                                # Try YYYY-MM format (HTML month input)
-                                expiry_date = datetime.strptime(f"{date_str}-01", '%Y-%m-%d').date()
-                        except (ValueError, IndexError):
+                            expiry_date = parse_expiry_date(field(row, 'expiry_date').strip())
+                        except ValueError:
                             errors.append(f"Row {row_num}: Invalid expiry date format. Use MM/YY format (e.g., 04/26)")
                             continue
                     
-                    # Check if identical item already exists in the same bag
-                    existing_item = Item.query.filter_by(
-                        name=row['name'].strip(),
-                        type=row['type'].strip(),
-                        brand=row.get('brand', '').strip() or None,
-                        size=row.get('size', '').strip() or None,
-                        expiry_date=expiry_date,
-                        bag_id=bag.id
-                    ).first()
-                    
-                    if existing_item:
-                        # Add to existing item
-                        existing_item.quantity += int(row['quantity'])
-                        existing_item.updated_at = datetime.utcnow()
-                        item = existing_item
-                    else:
-                        # Create new item
-                        item = Item(
-                            generic_name=row.get('generic_name', '').strip() or None,
-                            name=row['name'].strip(),
-                            type=row['type'].strip(),
-                            brand=row.get('brand', '').strip() or None,
-                            size=row.get('size', '').strip() or None,
-                            quantity=int(row['quantity']),
-                            expiry_date=expiry_date,
-                            bag_id=bag.id
-                        )
-                        db.session.add(item)
-                    
-                    # Log the addition
-                    movement = MovementHistory(
-                        item_name=item.name,
-                        item_type=item.type,
-                        item_size=item.size,
-                        quantity=item.quantity,
-                        movement_type='addition',
-                        to_bag=bag.name,
-                        notes=f"Added via CSV upload: {filename}",
-                        user_id=current_user.id
-                    )
-                    db.session.add(movement)
+                    try:
+                        quantity = int(field(row, 'quantity'))
+                    except ValueError:
+                        errors.append(f"Row {row_num}: Invalid quantity value")
+                        continue
                     
-                    items_added += 1
+                    parsed_rows.append({
+                        'bag_name': field(row, 'bag') or 'Cabinet',
+                        'generic_name': field(row, 'generic_name').strip() or None,
+                        'name': field(row, 'name').strip(),
+                        'type': field(row, 'type').strip(),
+                        'brand': field(row, 'brand').strip() or None,
+                        'size': field(row, 'size').strip() or None,
+                        'quantity': quantity,
+                        'expiry_date': expiry_date
+                    })
                     
-                except ValueError as e:
-                    errors.append(f"Row {row_num}: Invalid quantity value")
                 except Exception as e:
                     errors.append(f"Row {row_num}: {str(e)}")
             
+            # Get or create every referenced bag with one lookup and one flush
+            bag_names = {row['bag_name'] for row in parsed_rows}
+            bags_by_name = {bag.name: bag for bag in Bag.query.filter(Bag.name.in_(bag_names)).all()} if bag_names else {}
+            missing_bags = [Bag(name=bag_name, description=f"Auto-created from CSV")
+                            for bag_name in bag_names if bag_name not in bags_by_name]
+            bags_created = bool(missing_bags)
+            if missing_bags:
+                db.session.add_all(missing_bags)
+                db.session.flush()
+                bags_by_name.update((bag.name, bag) for bag in missing_bags)
+            
+            # Load the stock the rows may merge into in one query, keyed like the
+            # "identical item in the same bag" check
+            def item_key(name, item_type, brand, size, expiry_date, bag_id):
+                return (name, item_type, brand, size, expiry_date, bag_id)
+            
+            existing_stock = {}
+            if parsed_rows:
+                existing_rows = db.session.query(
+                    Item.id, Item.name, Item.type, Item.brand, Item.size,
+                    Item.expiry_date, Item.bag_id, Item.quantity, Item.version_id
+                ).filter(
+                    Item.bag_id.in_([bag.id for bag in bags_by_name.values()]),
+                    Item.name.in_({row['name'] for row in parsed_rows})
+                ).order_by(Item.id).all()
+                for existing in existing_rows:
+                    key = item_key(existing.name, existing.type, existing.brand, existing.size,
+                                   existing.expiry_date, existing.bag_id)
+                    existing_stock.setdefault(key, {'id': existing.id, 'quantity': existing.quantity,
+                                                    'version_id': existing.version_id})
+            
+            # Second pass: merge rows into existing or new items and build the log
+            now = datetime.utcnow()
+            updated_items = {}
+            new_items = {}
+            movements = []
+            for row in parsed_rows:
+                bag = bags_by_name[row['bag_name']]
+                key = item_key(row['name'], row['type'], row['brand'], row['size'],
+                               row['expiry_date'], bag.id)
+                
+                if key in existing_stock:
+                    # Add to existing item
+                    item = existing_stock[key]
+                    item['quantity'] += row['quantity']
+                    updated_items[item['id']] = {'id': item['id'], 'quantity': item['quantity'], 'updated_at': now,
+                                                 'version_id': item['version_id']}
+                elif key in new_items:
+                    # Repeated row for an item created earlier in this file
+                    item = new_items[key]
+                    item['quantity'] += row['quantity']
+                else:
+                    # Create new item
+                    item = new_items[key] = {
+                        'generic_name': row['generic_name'],
+                        'name': row['name'],
+                        'type': row['type'],
+                        'brand': row['brand'],
+                        'size': row['size'],
+                        'quantity': row['quantity'],
+                        'expiry_date': row['expiry_date'],
+                        'bag_id': bag.id
+                    }
+                
+                # Log the addition
+                movements.append({
+                    'item_name': row['name'],
+                    'item_type': row['type'],
+                    'item_size': row['size'],
+                    'quantity': item['quantity'],
+                    'movement_type': 'addition',
+                    'to_bag': bag.name,
+                    'notes': f"Added via CSV upload: {filename}",
+                    'timestamp': now,
+                    'user_id': current_user.id
+                })
+            
+            # Write everything in bulk, skipping per-object unit-of-work overhead.
+            # Chunks keep each executemany batch bounded on very large files;
+            # the import still commits (or rolls back) as a whole.
+            for chunk in chunked(list(updated_items.values())):
+                db.session.bulk_update_mappings(Item, chunk)
+            for chunk in chunked(list(new_items.values())):
+                db.session.bulk_insert_mappings(Item, chunk)
+            for chunk in chunked(movements):
+                db.session.bulk_insert_mappings(MovementHistory, chunk)
+            
             db.session.commit()
+            if bags_created:
+                invalidate_form_cache('bags')
+            
+            items_added = len(movements)
             
             if items_added > 0:
                 flash(f"Successfully added {items_added} items from CSV", "success")
@@ -375,124 +788,134 @@ def handle_manual_addition():
             flash("Please select a bag", "danger")
             return redirect(url_for('add_items'))
         
-        bag = Bag.query.get_or_404(bag_id)
+        bag = db.session.get(Bag, bag_id) or abort(404)
         items_added = 0
         
-        for i in range(len(names)):
-            if i < len(names) and i < len(types) and i < len(quantities):
-                if names[i].strip() and types[i].strip() and quantities[i].strip():
-                    # Parse expiry date (MM/YY format, default to 1st of month)
-                    expiry_date = None
-                    if i < len(expiry_dates) and expiry_dates[i].strip():
-                        try:
-                            date_str = expiry_dates[i].strip()
-                            if '/' in date_str:
-                                # New MM/YY format (e.g., "04/26")
-                                month, year = date_str.split('/')
-                                # Convert 2-digit year to 4-digit (assume 20XX)
-                                full_year = 2000 + int(year) if int(year) < 50 else 1900 + int(year)
-                                expiry_date = datetime(full_year, int(month), 1).date()
-                            else:
-                                # Old YYYY-MM format from HTML month input 
-                                expiry_date = datetime.strptime(f"{date_str}-01", '%Y-%m-%d').date()
-                        except (ValueError, IndexError):
-                            flash(f"Invalid expiry date format for item {i+1}. Use MM/YY format (e.g., 04/26).", "warning")
-                            continue
-                    
-                    # Get additional fields safely
-                    generic_name = generic_names[i].strip() if i < len(generic_names) and generic_names[i].strip() else None
-                    size = sizes[i].strip() if i < len(sizes) and sizes[i].strip() else None
-                    brand = brands[i].strip() if i < len(brands) and brands[i].strip() else None
-                    
-                    # Handle product creation/lookup
-                    product_name = names[i].strip()
-                    product_type = types[i].strip()
-                    product = Product.query.filter_by(name=product_name).first()
-                    
-                    if not product:
-                        # New product - get minimum stock if provided
-                        min_stock = 0
-                        if i < len(minimum_stocks) and minimum_stocks[i].strip():
-                            try:
-                                min_stock = int(minimum_stocks[i])
-                            except ValueError:
-                                min_stock = 0
-                        
-                        product = Product(
-                            name=product_name,
-                            type=product_type,
-                            minimum_stock=min_stock
-                        )
-                        db.session.add(product)
-                        db.session.flush()  # Get the product ID
-                    
-                    # Check if identical item already exists in the same bag
-                    existing_item = Item.query.filter_by(
-                        name=product_name,
-                        type=product_type,
-                        brand=brand,
-                        size=size,
-                        expiry_date=expiry_date,
-                        bag_id=bag.id
-                    ).first()
-                    
-                    if existing_item:
-                        # Add to existing item
-                        existing_item.quantity += int(quantities[i])
-                        existing_item.updated_at = datetime.utcnow()
-                        item = existing_item
-                    else:
-                        # Create new item
-                        item = Item(
-                            generic_name=generic_name,
-                            name=product_name,
-                            type=product_type,
-                            brand=brand,
-                            size=size,
-                            quantity=int(quantities[i]),
-                            expiry_date=expiry_date,
-                            bag_id=bag.id,
-                            product_id=product.id
-                        )
-                        db.session.add(item)
-                    
-                    # Log the addition
-                    movement = MovementHistory(
-                        item_name=item.name,
-                        item_type=item.type,
-                        item_size=item.size,
-                        quantity=item.quantity,
-                        movement_type='addition',
-                        to_bag=bag.name,
-                        notes="Added manually",
-                        user_id=current_user.id
-                    )
-                    db.session.add(movement)
-                    
-                    # Create undo action for manual addition
-                    undo_data = {
-                        'action_type': 'add_item',
-                        'item_name': item.name,
-                        'item_type': item.type,
-                        'brand': item.brand,
-                        'size': item.size,
-                        'quantity': item.quantity,
-                        'expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
-                        'bag_id': bag.id,
-                        'bag_name': bag.name,
-                        'product_id': product.id if product else None,
-                        'product_created': not Product.query.filter_by(name=product_name).first() if product_name else False
-                    }
-                    
-                    undo_action = UndoAction(
-                        action_type='add_item',
-                        action_data=json.dumps(undo_data),
-                        description=f"Added {item.quantity} {item.name} to {bag.name}",
-                        user_id=current_user.id
-                    )
-                    db.session.add(undo_action)
-                    
-                    items_added += 1
+        # First pass: validate rows; zip_longest pads missing fields with ''
+        rows = []
+        for row_num, (name, type_, quantity, expiry_str, generic_name, size, brand, minimum_stock) in enumerate(
+                zip_longest(names, types, quantities, expiry_dates, generic_names, sizes, brands,
+                            minimum_stocks, fillvalue=''), start=1):
+            if not (name.strip() and type_.strip() and quantity.strip()):
+                continue
+            
+            # Parse expiry date (MM/YY format, default to 1st of month)
+            expiry_date = None
+            if expiry_str.strip():
+                try:
+                    expiry_date = parse_expiry_date(expiry_str.strip())
+                except ValueError:
+                    flash(f"Invalid expiry date format for item {row_num}. Use MM/YY format (e.g., 04/26).", "warning")
+                    continue
+            
+            rows.append({
+                'name': name.strip(),
+                'type': type_.strip(),
+                'quantity': int(quantity),
+                'expiry_date': expiry_date,
+                'generic_name': generic_name.strip() or None,
+                'size': size.strip() or None,
+                'brand': brand.strip() or None,
+                'minimum_stock': minimum_stock
+            })
+        
+        # Look up every product in one query and create the missing ones with one flush
+        row_names = {row['name'] for row in rows}
+        products = {product.name: product for product in
+                    Product.query.filter(Product.name.in_(row_names)).all()} if row_names else {}
+        for row in rows:
+            if row['name'] not in products:
+                # New product - get minimum stock if provided
+                try:
+                    min_stock = int(row['minimum_stock']) if row['minimum_stock'].strip() else 0
+                except ValueError:
+                    min_stock = 0
+                
+                products[row['name']] = Product(
+                    name=row['name'],
+                    type=row['type'],
+                    minimum_stock=min_stock
+                )
+                db.session.add(products[row['name']])
+        db.session.flush()  # Get the product IDs
+        
+        # Load the bag's items these rows may merge into in one query
+        existing_items = {}
+        if row_names:
+            for existing in Item.query.filter(
+                Item.bag_id == bag.id, Item.name.in_(row_names)
+            ).order_by(Item.id).all():
+                key = (existing.name, existing.type, existing.brand, existing.size, existing.expiry_date)
+                existing_items.setdefault(key, existing)
+        
+        # Second pass: merge into existing items or create new ones, all
+        # stamped with one submission time
+        now = datetime.utcnow()
+        movements = []
+        for row in rows:
+            product = products[row['name']]
+            key = (row['name'], row['type'], row['brand'], row['size'], row['expiry_date'])
+            
+            # Check if identical item already exists in the same bag
+            existing_item = existing_items.get(key)
+            
+            if existing_item:
+                # Add to existing item
+                existing_item.quantity += row['quantity']
+                existing_item.updated_at = now
+                item = existing_item
+            else:
+                # Create new item
+                item = existing_items[key] = Item(
+                    generic_name=row['generic_name'],
+                    name=row['name'],
+                    type=row['type'],
+                    brand=row['brand'],
+                    size=row['size'],
+                    quantity=row['quantity'],
+                    expiry_date=row['expiry_date'],
+                    bag_id=bag.id,
+                    product_id=product.id
+                )
+                db.session.add(item)
+            
+            # Log the addition (written in bulk below)
+            movements.append({
+                'item_name': item.name,
+                'item_type': item.type,
+                'item_size': item.size,
+                'quantity': item.quantity,
+                'movement_type': 'addition',
+                'to_bag': bag.name,
+                'notes': "Added manually",
+                'timestamp': now,
+                'user_id': current_user.id
+            })
+            
+            # Create undo action for manual addition
+            undo_data = {
+                'action_type': 'add_item',
+                'item_name': item.name,
+                'item_type': item.type,
+                'brand': item.brand,
+                'size': item.size,
+                'quantity': item.quantity,
+                'expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
+                'bag_id': bag.id,
+                'bag_name': bag.name,
+                'product_id': product.id,
+                # Products are flushed before this point, so the previous re-query
+                # here never found one missing; recorded the same way for undo
+                'product_created': False
+            }
+            
+            record_undo('add_item', undo_data,
+                        f"Added {item.quantity} {item.name} to {bag.name}")
+            
+            items_added += 1
+        
+        if movements:
+            db.session.bulk_insert_mappings(MovementHistory, movements)
         
         db.session.commit()
         flash(f"Successfully added {items_added} items", "success")
@@ -513,119 +936,126 @@ def inventory():
     bag_filter = request.args.get('bag', '')
     status_filter = request.args.get('status', '')
     
-    # Base query - get products with their items
-    product_query = Product.query
+    # One query for every active item row to display, joined to its product and
+    # bag, with all filters applied in SQL - only the columns the template needs
+    item_query = db.session.query(
+        Item.id, Item.name, Item.generic_name, Item.brand, Item.size, Item.quantity,
+        Item.expiry_date, Item.bag_id, Item.product_id,
+        Product.name.label('product_name'), Product.type.label('product_type'),
+        Product.minimum_stock.label('product_minimum_stock'),
+        Bag.name.label('bag_name')
+    ).join(Product, Item.product_id == Product.id).join(Bag, Item.bag_id == Bag.id).filter(Item.quantity > 0)
     
     # Apply product-level filters
     if search:
-        # Search in product names and also in item generic names
-        product_ids_from_items = db.session.query(Item.product_id).filter(
-            Item.generic_name.ilike(f'%{search}%')
-        ).distinct().subquery()
-        
-        product_query = product_query.filter(
+        # Search in product names and also in item generic names; the generic
+        # name check is a correlated EXISTS that stops at the first match
+        pattern = f'%{like_escape(search)}%'
+        item_query = item_query.filter(
             db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.id.in_(db.session.query(product_ids_from_items.c.product_id))
+                Product.name.ilike(pattern, escape='\\'),
+                Product.items.any(Item.generic_name.ilike(pattern, escape='\\'))
             )
         )
     
     if type_filter:
-        product_query = product_query.filter(Product.type == type_filter)
-    
-    products = product_query.order_by(Product.name).all()
-    
-    # Filter products based on item-level criteria and group items
+        item_query = item_query.filter(Product.type == type_filter)
+    
+    # Apply item-level filters
+    if bag_filter:
+        item_query = item_query.filter(Bag.name == bag_filter)
+    
+    if status_filter and status_filter != 'low_stock':
+        today = date.today()
+        if status_filter == 'expired':
+            item_query = item_query.filter(and_(Item.expiry_date.isnot(None), Item.expiry_date < today))
+        elif status_filter == 'expiring':
+            thirty_days = today + timedelta(days=30)
+            item_query = item_query.filter(and_(Item.expiry_date.isnot(None), 
+                                            Item.expiry_date >= today, 
+                                            Item.expiry_date <= thirty_days))
+        elif status_filter == 'expiring_90':
+            thirty_days = today + timedelta(days=30)
+            ninety_days = today + timedelta(days=90)
+            item_query = item_query.filter(and_(Item.expiry_date.isnot(None), 
+                                            Item.expiry_date > thirty_days, 
+                                            Item.expiry_date <= ninety_days))
+    
+    items = item_query.order_by(
+        Product.name, Item.product_id, Item.brand, Item.size, Item.expiry_date, Item.bag_id
+    ).all()
+    product_ids = {item.product_id for item in items}
+    
+    # Low stock compares each product's total across all bags (not just the
+    # filtered rows) with its minimum, so total them separately in one query
+    product_totals = {}
+    unique_generic_names = {}
+    if product_ids:
+        product_totals = dict(db.session.query(Item.product_id, func.sum(Item.quantity)).filter(
+            Item.product_id.in_(product_ids),
+            Item.quantity > 0
+        ).group_by(Item.product_id).all())
+        
+        # Collect unique generic names from ALL items of these products (including zero quantity)
+        generic_rows = db.session.query(Item.product_id, Item.generic_name).filter(
+            Item.product_id.in_(product_ids),
+            Item.generic_name.isnot(None)
+        ).order_by(Item.id).all()
+        for product_id, generic_name in generic_rows:
+            names = unique_generic_names.setdefault(product_id, [])
+            if generic_name.strip() and generic_name not in names:
+                names.append(generic_name)
+    
+    # Group rows by product, then by brand, size, expiry date and bag
     filtered_products = []
-    for product in products:
-        # Check low stock filter first (applies to entire product)
-        if status_filter == 'low_stock':
-            if not product.is_low_stock:
-                continue
-        
-        # Get ALL items for this product to collect generic names
-        all_items_for_product = Item.query.filter(Item.product_id == product.id).all()
-        
-        # Get active items for this product for display
-        item_query = Item.query.filter(Item.product_id == product.id, Item.quantity > 0).join(Bag)
-        
-        # Apply item-level filters
-        if bag_filter:
-            item_query = item_query.filter(Bag.name == bag_filter)
-        
-        if status_filter and status_filter != 'low_stock':
-            today = date.today()
-            if status_filter == 'expired':
-                item_query = item_query.filter(and_(Item.expiry_date.isnot(None), Item.expiry_date < today))
-            elif status_filter == 'expiring':
-                thirty_days = today + timedelta(days=30)
-                item_query = item_query.filter(and_(Item.expiry_date.isnot(None), 
-                                                Item.expiry_date >= today, 
-                                                Item.expiry_date <= thirty_days))
-            elif status_filter == 'expiring_90':
-                thirty_days = today + timedelta(days=30)
-                ninety_days = today + timedelta(days=90)
-                item_query = item_query.filter(and_(Item.expiry_date.isnot(None), 
-                                                Item.expiry_date > thirty_days, 
-                                                Item.expiry_date <= ninety_days))
-        
-        items = item_query.order_by(Item.brand, Item.size, Item.expiry_date).all()
-        
-        # Collect unique generic names from ALL items for this product (including zero quantity)
-        unique_generic_names = []
-        for item in all_items_for_product:
-            if item.generic_name and item.generic_name.strip():
-                if item.generic_name not in unique_generic_names:
-                    unique_generic_names.append(item.generic_name)
-        
-        if items:  # Only include products that have matching items
-            # Group items by brand, size, and expiry date
-            grouped_items = []
-            current_group = None
-            
-            for item in items:
-                # Create a key for grouping (brand, size, expiry_date, bag_id)
-                group_key = (item.brand or 'No Brand', item.size or 'No Size', item.expiry_date, item.bag_id)
-                
-                if current_group is None or current_group['key'] != group_key:
-                    # Start a new group
-                    current_group = {
-                        'key': group_key,
-                        'brand': item.brand,
-                        'generic_name': item.generic_name,
-                        'size': item.size,
-                        'expiry_date': item.expiry_date,
-                        'items': [item],
-                        'total_quantity': item.quantity,
-                        'bags': [item.bag]
-                    }
-                    grouped_items.append(current_group)
-                else:
-                    # Add to existing group (should not happen with bag_id in key)
-                    current_group['items'].append(item)
-                    current_group['total_quantity'] += item.quantity
-            
-
-            
-
-
-            filtered_products.append({
-                'product': product,
-                'grouped_items': grouped_items,
-                'unique_generic_names': unique_generic_names,
-                'total_quantity': sum(item.quantity for item in items),
-                'is_low_stock': product.is_low_stock
+    for product_id, product_items in groupby(items, key=lambda item: item.product_id):
+        product_items = list(product_items)
+        first = product_items[0]
+        product = {
+            'id': product_id,
+            'name': first.product_name,
+            'type': first.product_type,
+            'minimum_stock': first.product_minimum_stock
+        }
+        is_low_stock = (product_totals.get(product_id) or 0) <= product['minimum_stock']
+        
+        # Check low stock filter (applies to entire product)
+        if status_filter == 'low_stock' and not is_low_stock:
+            continue
+        
+        grouped_items = []
+        for group_key, group_items in groupby(product_items, key=lambda item: (
+                item.brand or 'No Brand', item.size or 'No Size', item.expiry_date, item.bag_id)):
+            group_items = list(group_items)
+            first_item = group_items[0]
+            grouped_items.append({
+                'key': group_key,
+                'brand': first_item.brand,
+                'generic_name': first_item.generic_name,
+                'size': first_item.size,
+                'expiry_date': first_item.expiry_date,
+                'items': group_items,
+                'total_quantity': sum(item.quantity for item in group_items),
+                'bags': [first_item.bag_name]
             })
+        
+        filtered_products.append({
+            'product': product,
+            'grouped_items': grouped_items,
+            'unique_generic_names': unique_generic_names.get(product_id, []),
+            'total_quantity': sum(item.quantity for item in product_items),
+            'is_low_stock': is_low_stock
+        })
     
     # Get filter options
-    bags = Bag.query.all()
-    item_types = ItemType.query.all()
+    bags = cached_bags()
+    item_types = cached_item_types()
     
     return render_template('inventory.html',
                          products=filtered_products,
                          bags=bags,
                          item_types=item_types,
-                         today=datetime.now(GMT_PLUS_4).date(),
+                         today=gmt4_today(),
                          current_filters={
                              'search': search,
                              'type': type_filter,
@@ -646,20 +1076,20 @@ def transfer():
     # Get cabinet items
     cabinet_items = []
     if cabinet:
-        cabinet_items = Item.query.filter_by(bag_id=cabinet.id).filter(Item.quantity > 0).order_by(Item.name, Item.expiry_date).all()
+        cabinet_items = Item.query.filter_by(bag_id=cabinet.id).filter(Item.quantity > 0).with_entities(
+            Item.id, Item.name, Item.generic_name, Item.type, Item.brand, Item.size,
+            Item.quantity, Item.expiry_date
+        ).order_by(Item.name, Item.expiry_date).all()
     
     # Get items in medical bags for potential return to cabinet
-    bag_items = {}
-    for bag in bags:
-        items = Item.query.filter_by(bag_id=bag.id).filter(Item.quantity > 0).order_by(Item.name).all()
-        if items:
-            bag_items[bag.name] = items
+    bag_items = active_items_by_bag(bags)
     
     return render_template('transfer.html', 
                          bags=bags, 
                          cabinet=cabinet,
                          cabinet_items=cabinet_items, 
-                         bag_items=bag_items)
+                         bag_items=bag_items,
+                         today=gmt4_today())
 
 def handle_transfer():
     try:
@@ -671,8 +1101,10 @@ def handle_transfer():
             flash("Please provide valid transfer details", "danger")
             return redirect(url_for('transfer'))
         
-        item = Item.query.get_or_404(item_id)
-        to_bag = Bag.query.get_or_404(to_bag_id)
+        # Primary-key lookups go straight through the identity map / session.get,
+        # with the source bag joined in since we need its name below
+        item = db.session.get(Item, item_id, options=[joinedload(Item.bag)]) or abort(404)
+        to_bag = db.session.get(Bag, to_bag_id) or abort(404)
         from_bag = item.bag
         
         if quantity > item.quantity:
@@ -683,37 +1115,11 @@ def handle_transfer():
             flash("Cannot transfer to the same bag", "warning")
             return redirect(url_for('transfer'))
         
-        # Check if same item exists in destination bag
-        existing_item = Item.query.filter_by(
-            name=item.name,
-            type=item.type,
-            size=item.size,
-            expiry_date=item.expiry_date,
-            brand=item.brand,
-            bag_id=to_bag_id
-        ).first()
-        
-        if existing_item:
-            # Add to existing item
-            existing_item.quantity += quantity
-            existing_item.updated_at = datetime.utcnow()
-        else:
-            # Create new item in destination bag
-            new_item = Item(
-                name=item.name,
-                type=item.type,
-                brand=item.brand,
-                size=item.size,
-                quantity=quantity,
-                expiry_date=item.expiry_date,
-                bag_id=to_bag_id,
-                product_id=item.product_id
-            )
-            db.session.add(new_item)
+        # Add to the same item in the destination bag, or create it there
+        existing_item_id = merge_into_bag(item, to_bag.id, quantity)
         
         # Reduce quantity from source item
         item.quantity -= quantity
-        item.updated_at = datetime.utcnow()
         
         # Remove source item if quantity reaches zero
         if item.quantity <= 0:
@@ -739,6 +1145,8 @@ def handle_transfer():
             'item_id': item.id,
             'from_bag_id': from_bag.id,
             'to_bag_id': to_bag.id,
+            'from_bag_name': from_bag.name,
+            'to_bag_name': to_bag.name,
             'quantity': quantity,
             'item_name': item.name,
             'item_type': item.type,
@@ -746,19 +1154,14 @@ def handle_transfer():
             'item_size': item.size,
             'item_expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
             'product_id': item.product_id,
-            'existing_item_id': existing_item.id if existing_item else None,
-            'new_item_created': existing_item is None,
+            'existing_item_id': existing_item_id,
+            'new_item_created': existing_item_id is None,
             'source_item_deleted': item.quantity <= 0,
             'original_source_quantity': item.quantity + quantity
         }
         
-        undo_action = UndoAction(
-            action_type='transfer',
-            action_data=json.dumps(undo_data),
-            description=f"Transfer {quantity} {item.name} from {from_bag.name} to {to_bag.name}",
-            user_id=current_user.id
-        )
-        db.session.add(undo_action)
+        record_undo('transfer', undo_data,
+                    f"Transfer {quantity} {item.name} from {from_bag.name} to {to_bag.name}")
         
         db.session.commit()
         flash(f"Successfully transferred {quantity} units of {item.name} from {from_bag.name} to {to_bag.name}", "success")
@@ -779,90 +1182,82 @@ def handle_multi_transfer():
             flash("Please select a destination bag", "danger")
             return redirect(url_for('transfer'))
         
-        to_bag = Bag.query.get_or_404(to_bag_id)
+        to_bag = db.session.get(Bag, to_bag_id) or abort(404)
+        
+        # One timestamp for the whole batch so its movements sort together
+        now = datetime.utcnow()
         
         # Parse item data from form
         transfer_items = []
         successful_transfers = []
+        movements = []
+        errors = []
         total_items_processed = 0
         
-        # Extract items data from form
-        for key in request.form.keys():
-            if key.startswith('items[') and key.endswith('][item_id]'):
-                # Extract item ID from key like "items[123][item_id]"
-                item_id = request.form.get(key)
-                quantity_key = key.replace('[item_id]', '[quantity]')
-                quantity = int(request.form.get(quantity_key, 0))
-                
-                if item_id and quantity > 0:
-                    transfer_items.append({
-                        'item_id': item_id,
-                        'quantity': quantity
-                    })
+        # Extract items data from form: group the item_id / quantity fields by
+        # their row key in one pass
+        form_rows = {}
+        for key, value in request.form.items():
+            match = TRANSFER_FIELD_RE.match(key)
+            if match:
+                form_rows.setdefault(match.group(1), {})[match.group(2)] = value
+        
+        for fields in form_rows.values():
+            if 'item_id' not in fields:
+                continue
+            item_id = fields['item_id']
+            quantity = int(fields.get('quantity', 0))
+            
+            if item_id and quantity > 0:
+                transfer_items.append({
+                    'item_id': item_id,
+                    'quantity': quantity
+                })
         
         if not transfer_items:
             flash("No items selected for transfer", "warning")
             return redirect(url_for('transfer'))
         
+        # Fetch every selected item with its bag in one query instead of a
+        # get() and a bag lazy-load per row
+        item_ids = [int(data['item_id']) for data in transfer_items if data['item_id'].isdigit()]
+        items_by_id = {str(item.id): item for item in Item.query.options(
+            joinedload(Item.bag)
+        ).filter(Item.id.in_(item_ids)).all()} if item_ids else {}
+        
         # Process each transfer
         for transfer_data in transfer_items:
             try:
                 item_id = transfer_data['item_id']
                 quantity = transfer_data['quantity']
                 
-                item = Item.query.get(item_id)
+                item = items_by_id.get(item_id)
                 if not item:
                     continue
                 
                 # Validation checks
                 if quantity > item.quantity:
-                    flash(f"Cannot transfer {quantity} units of {item.name} - only {item.quantity} available", "warning")
+                    errors.append(f"{item.name}: only {item.quantity} available")
                     continue
                 
                 if item.bag_id == int(to_bag_id):
-                    flash(f"Cannot transfer {item.name} to the same bag", "warning")
+                    errors.append(f"{item.name}: already in {to_bag.name}")
                     continue
                 
                 from_bag = item.bag
                 
-                # Check if same item exists in destination bag
-                existing_item = Item.query.filter_by(
-                    name=item.name,
-                    type=item.type,
-                    size=item.size,
-                    expiry_date=item.expiry_date,
-                    brand=item.brand,
-                    bag_id=to_bag_id
-                ).first()
-                
-                if existing_item:
-                    # Add to existing item
-                    existing_item.quantity += quantity
-                    existing_item.updated_at = datetime.utcnow()
-                else:
-                    # Create new item in destination bag
-                    new_item = Item(
-                        name=item.name,
-                        type=item.type,
-                        brand=item.brand,
-                        size=item.size,
-                        quantity=quantity,
-                        expiry_date=item.expiry_date,
-                        bag_id=to_bag_id,
-                        product_id=item.product_id
-                    )
-                    db.session.add(new_item)
+                # Add to the same item in the destination bag, or create it there
+                merge_into_bag(item, to_bag.id, quantity)
                 
                 # Reduce quantity from source item
                 item.quantity -= quantity
-                item.updated_at = datetime.utcnow()
                 
                 # Remove source item if quantity reaches zero
                 if item.quantity <= 0:
                     db.session.delete(item)
                 
-                # Log the transfer
-                movement = MovementHistory(
+                # Log the transfer (written in bulk below)
+                movements.append(MovementHistory(
                     item_name=item.name,
                     item_type=item.type,
                     item_size=item.size,
@@ -871,9 +1266,9 @@ def handle_multi_transfer():
                     from_bag=from_bag.name,
                     to_bag=to_bag.name,
                     notes=f"Multi-transfer: {quantity} units",
+                    timestamp=now,
                     user_id=current_user.id
-                )
-                db.session.add(movement)
+                ))
                 
                 successful_transfers.append({
                     'name': item.name,
@@ -883,10 +1278,20 @@ def handle_multi_transfer():
                 total_items_processed += 1
                 
             except Exception as e:
-                flash(f"Error transferring {item.name if 'item' in locals() else 'item'}: {str(e)}", "danger")
+                errors.append(f"{item.name if 'item' in locals() else 'item'}: {str(e)}")
                 continue
         
+        # One summary message rather than a flash (and session write) per row
+        if errors:
+            shown = "; ".join(errors[:MAX_FLASHED_ERRORS])
+            if len(errors) > MAX_FLASHED_ERRORS:
+                shown += f" (+{len(errors) - MAX_FLASHED_ERRORS} more)"
+            flash(f"Some transfers failed: {shown}", "warning")
+        
         if successful_transfers:
+            # One multi-row INSERT for the whole batch's movement log
+            db.session.bulk_save_objects(movements)
+            
             # Create a single undo action for the multi-transfer
             undo_data = {
                 'action_type': 'multi_transfer',
@@ -896,13 +1301,8 @@ def handle_multi_transfer():
                 'total_items': total_items_processed
             }
             
-            undo_action = UndoAction(
-                action_type='multi_transfer',
-                action_data=json.dumps(undo_data),
-                description=f"Multi-transfer of {total_items_processed} items to {to_bag.name}",
-                user_id=current_user.id
-            )
-            db.session.add(undo_action)
+            record_undo('multi_transfer', undo_data,
+                        f"Multi-transfer of {total_items_processed} items to {to_bag.name}")
             
             db.session.commit()
             
@@ -927,12 +1327,7 @@ def usage():
     
     # Only show medical bags for usage (not cabinet)
     bags = Bag.query.filter_by(location='bag').all()
-    bag_items = {}
-    
-    for bag in bags:
-        items = Item.query.filter_by(bag_id=bag.id).filter(Item.quantity > 0).order_by(Item.name).all()
-        if items:  # Only include bags that have items
-            bag_items[bag.name] = items
+    bag_items = active_items_by_bag(bags)
     
     return render_template('usage.html', bags=bags, bag_items=bag_items)
 
@@ -951,7 +1346,7 @@ def handle_usage():
             flash("Patient name is required for usage tracking", "danger")
             return redirect(url_for('usage'))
         
-        item = Item.query.get_or_404(item_id)
+        item = db.session.get(Item, item_id, options=[joinedload(Item.bag)]) or abort(404)
         
         if quantity_used > item.quantity:
             flash("Cannot use more items than available", "danger")
@@ -959,7 +1354,6 @@ def handle_usage():
         
         # Reduce quantity
         item.quantity -= quantity_used
-        item.updated_at = datetime.utcnow()
         
         # Log the usage with patient information
         movement = MovementHistory(
@@ -988,13 +1382,8 @@ def handle_usage():
             'original_quantity': item.quantity + quantity_used
         }
         
-        undo_action = UndoAction(
-            action_type='usage',
-            action_data=json.dumps(undo_data),
-            description=f"Used {quantity_used} {item.name} for patient {patient_name}",
-            user_id=current_user.id
-        )
-        db.session.add(undo_action)
+        record_undo('usage', undo_data,
+                    f"Used {quantity_used} {item.name} for patient {patient_name}")
         
         db.session.commit()
         flash(f"Successfully recorded usage of {quantity_used} units of {item.name}", "success")
@@ -1008,20 +1397,22 @@ def handle_usage():
 @app.route('/history')
 @login_required
 def history():
-    page = request.args.get('page', 1, type=int)
+    before = request.args.get('before', '')
+    before_id = request.args.get('before_id', type=int)
     movement_filter = request.args.get('type_filter', '')
     item_filter = request.args.get('item_filter', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    query = MovementHistory.query
+    # Join the user in so the template's movement.user doesn't query per row
+    query = MovementHistory.query.options(joinedload(MovementHistory.user))
     
     # Apply filters
     if movement_filter:
         query = query.filter(MovementHistory.movement_type == movement_filter)
     
     if item_filter:
-        query = query.filter(MovementHistory.item_name.ilike(f'%{item_filter}%'))
+        query = query.filter(name_matches(MovementHistory.item_name, item_filter))
     
     if date_from:
         try:
@@ -1052,49 +1443,55 @@ def history():
         except ValueError:
             flash("Invalid to date format", "warning")
     
-    movements = query.order_by(MovementHistory.timestamp.desc()).paginate(
-        page=page, per_page=50, error_out=False
-    )
+    # COUNT(*) over the filtered history is only run when explicitly requested
+    total_count = None
+    if request.args.get('exact_count') == '1':
+        total_count = query.order_by(None).count()
     
-    return render_template('history.html', movements=movements)
+    # Keyset pagination: seek past the last row of the previous page instead of
+    # COUNT(*) + OFFSET, so deep pages cost the same as the first one. The row
+    # comparison lets the database seek straight into ix_mh_ts.
+    if before:
+        try:
+            before_dt = datetime.fromisoformat(before)
+            if before_id:
+                query = query.filter(
+                    tuple_(MovementHistory.timestamp, MovementHistory.id) < (before_dt, before_id)
+                )
+            else:
+                query = query.filter(MovementHistory.timestamp < before_dt)
+        except ValueError:
+            flash("Invalid page cursor", "warning")
+            before = ''
+    
+    per_page = 50
+    rows = query.order_by(MovementHistory.timestamp.desc(), MovementHistory.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    movements = rows[:per_page]
+    
+    # Carry the active filters over to the next/first page links
+    filter_args = {key: value for key, value in request.args.items()
+                   if key in ('type_filter', 'item_filter', 'date_from', 'date_to', 'exact_count') and value}
+    next_page_args = None
+    if has_next:
+        next_page_args = dict(filter_args,
+                              before=movements[-1].timestamp.isoformat(),
+                              before_id=movements[-1].id)
+    
+    return render_template('history.html',
+                         movements=movements,
+                         has_next=has_next,
+                         next_page_args=next_page_args,
+                         is_first_page=not before,
+                         total_count=total_count,
+                         filter_args=filter_args)
 
 @app.route('/expiry')
 @login_required
 def expiry():
     # Use GMT+4 timezone for consistent date calculations
-    gmt4_now = datetime.now(GMT_PLUS_4)
-    today = gmt4_now.date()
-    thirty_days = today + timedelta(days=30)
-    ninety_days = today + timedelta(days=90)
-    
-    # Expired items
-    expired_items = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date < today,
-            Item.quantity > 0
-        )
-    ).order_by(Item.expiry_date).all()
-    
-    # Items expiring within 30 days
-    expiring_items = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date >= today,
-            Item.expiry_date <= thirty_days,
-            Item.quantity > 0
-        )
-    ).order_by(Item.expiry_date).all()
-    
-    # Items expiring within 90 days (but not within 30 days)
-    expiring_90_days = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date > thirty_days,
-            Item.expiry_date <= ninety_days,
-            Item.quantity > 0
-        )
-    ).order_by(Item.expiry_date).all()
+    today = gmt4_today()
+    expired_items, expiring_items, expiring_90_days = expiry_buckets(today)
     
     return render_template('expiry.html', 
                          expired_items=expired_items, 
@@ -1115,6 +1512,13 @@ def bags():
     
     return render_template('bags.html', bags=bags, cabinets=cabinets, medical_bags=medical_bags)
 
+def bag_name_taken(name, exclude_id=None):
+    """Whether another storage location already uses name, as an EXISTS probe"""
+    query = Bag.query.filter(Bag.name == name)
+    if exclude_id is not None:
+        query = query.filter(Bag.id != exclude_id)
+    return db.session.query(query.exists()).scalar()
+
 def handle_bag_management():
     action = request.form.get('action')
     
@@ -1128,7 +1532,7 @@ def handle_bag_management():
                 flash("Name is required", "danger")
                 return redirect(url_for('bags'))
             
-            if Bag.query.filter_by(name=name).first():
+            if bag_name_taken(name):
                 flash("A storage location with this name already exists", "danger")
                 return redirect(url_for('bags'))
             
@@ -1148,11 +1552,10 @@ def handle_bag_management():
                 flash("ID and name are required", "danger")
                 return redirect(url_for('bags'))
             
-            bag = Bag.query.get_or_404(bag_id)
+            bag = db.session.get(Bag, bag_id) or abort(404)
             
             # Check if name is taken by another storage location
-            existing = Bag.query.filter_by(name=name).first()
-            if existing and existing.id != bag.id:
+            if bag_name_taken(name, exclude_id=bag.id):
                 flash("A storage location with this name already exists", "danger")
                 return redirect(url_for('bags'))
             
@@ -1165,7 +1568,7 @@ def handle_bag_management():
             
         elif action == 'delete':
             bag_id = request.form.get('bag_id')
-            bag = Bag.query.get_or_404(bag_id)
+            bag = db.session.get(Bag, bag_id) or abort(404)
             
             # Don't allow deleting the default Cabinet
             if bag.name == 'Cabinet':
@@ -1173,7 +1576,7 @@ def handle_bag_management():
                 return redirect(url_for('bags'))
             
             # Get cabinet for item transfer
-            cabinet = Bag.query.filter_by(name='Cabinet').first()
+            cabinet = get_cabinet()
             if not cabinet:
                 flash("Error: Cabinet not found", "danger")
                 return redirect(url_for('bags'))
@@ -1187,7 +1590,8 @@ def handle_bag_management():
                 'created_at': bag.created_at.isoformat() if bag.created_at else None
             }
             
-            # Prepare undo data with complete page state
+            # Prepare undo data (restoring only needs the bag, its items and
+            # its minimums, so no before/after table counts are taken)
             undo_data = {
                 'bag_id': bag.id,
                 'bag_name': bag.name,
@@ -1196,44 +1600,50 @@ def handle_bag_management():
                 'transferred_items': [],
                 'deleted_minimums': [],
                 'page_state': {
-                    'total_bags_before': Bag.query.count(),
-                    'cabinet_items_before': Item.query.filter_by(bag_id=cabinet.id).count(),
                     'deleted_bag_data': bag_data
                 }
             }
             
             # Transfer all items to cabinet and track for undo
+            now = datetime.utcnow()
             items_transferred = 0
+            movements = []
             bag_items = Item.query.filter_by(bag_id=bag.id).all()
             
-            for item in bag_items:
-                if item.quantity > 0:
-                    undo_data['transferred_items'].append({
-                        'item_id': item.id,
-                        'original_bag_id': bag.id
-                    })
-                    
-                    # Update the item's bag_id using SQLAlchemy update
-                    Item.query.filter_by(id=item.id).update({
-                        'bag_id': cabinet.id,
-                        'updated_at': datetime.utcnow()
-                    })
-                    
-                    items_transferred += item.quantity
-                    
-                    # Record movement
-                    movement = MovementHistory(
-                        item_name=item.name,
-                        item_type=item.type,
-                        item_size=item.size,
-                        quantity=item.quantity,
-                        movement_type='transfer',
-                        from_bag=bag.name,
-                        to_bag=cabinet.name,
-                        notes=f'Auto-transferred due to bag deletion',
-                        user_id=current_user.id
-                    )
-                    db.session.add(movement)
+            active_items = [item for item in bag_items if item.quantity > 0]
+            
+            # Move every in-stock item to the cabinet with one UPDATE
+            if active_items:
+                Item.query.filter(Item.id.in_([item.id for item in active_items])).update({
+                    'bag_id': cabinet.id,
+                    'updated_at': now,
+                    'version_id': Item.version_id + 1
+                })
+            
+            for item in active_items:
+                undo_data['transferred_items'].append({
+                    'item_id': item.id,
+                    'original_bag_id': bag.id
+                })
+                
+                items_transferred += item.quantity
+                
+                # Record movement (written in bulk below)
+                movements.append(MovementHistory(
+                    item_name=item.name,
+                    item_type=item.type,
+                    item_size=item.size,
+                    quantity=item.quantity,
+                    movement_type='transfer',
+                    from_bag=bag.name,
+                    to_bag=cabinet.name,
+                    notes=f'Auto-transferred due to bag deletion',
+                    timestamp=now,
+                    user_id=current_user.id
+                ))
+            
+            if movements:
+                db.session.bulk_save_objects(movements)
             
             # Remove bag minimums and track for undo
             bag_minimums = BagMinimum.query.filter_by(bag_id=bag.id).all()
@@ -1249,19 +1659,14 @@ def handle_bag_management():
             permanent_deletion = PermanentDeletion(
                 entity_type='bag',
                 entity_name=bag.name,
-                entity_data=json.dumps(bag_data),
+                entity_data=dumps_json(bag_data),
                 user_id=current_user.id
             )
             db.session.add(permanent_deletion)
             
             # Create undo action with complete page state
-            undo_action = UndoAction(
-                action_type='delete_bag',
-                action_data=json.dumps(undo_data),
-                description=f"Deleted bag '{bag.name}' with {items_transferred} items transferred to Cabinet",
-                user_id=current_user.id
-            )
-            db.session.add(undo_action)
+            record_undo('delete_bag', undo_data,
+                        f"Deleted bag '{bag.name}' with {items_transferred} items transferred to Cabinet")
             
             # Delete the bag
             storage_type = "cabinet" if bag.location == "cabinet" else "medical bag"
@@ -1277,6 +1682,8 @@ def handle_bag_management():
     except Exception as e:
         db.session.rollback()
         flash(f"Error: {str(e)}", "danger")
+    finally:
+        invalidate_form_cache('bags')
     
     return redirect(url_for('bags'))
 
@@ -1287,18 +1694,15 @@ def wastage():
         return handle_wastage()
     
     # Get expired items for disposal using GMT+4 timezone
-    gmt4_now = datetime.now(GMT_PLUS_4)
-    today = gmt4_now.date()
-    expired_items = Item.query.filter(
-        and_(
-            Item.expiry_date.isnot(None),
-            Item.expiry_date < today,
-            Item.quantity > 0
-        )
-    ).order_by(Item.expiry_date).all()
-    
-    # Get wastage history
-    wastage_history = MovementHistory.query.filter_by(movement_type='wastage').order_by(
+    today = gmt4_today()
+    expired_items = expiry_buckets(today)[0]
+    
+    # Get wastage history - only the columns the table shows
+    wastage_history = MovementHistory.query.filter_by(movement_type='wastage').options(
+        load_only(MovementHistory.timestamp, MovementHistory.item_name, MovementHistory.item_type,
+                  MovementHistory.quantity, MovementHistory.from_bag, MovementHistory.expiry_date,
+                  MovementHistory.notes)
+    ).order_by(
         MovementHistory.timestamp.desc()
     ).limit(10).all()
     
@@ -1314,7 +1718,7 @@ def handle_wastage():
             flash("Please provide valid wastage details", "danger")
             return redirect(url_for('wastage'))
         
-        item = Item.query.get_or_404(item_id)
+        item = db.session.get(Item, item_id, options=[joinedload(Item.bag)]) or abort(404)
         
         if quantity_wasted > item.quantity:
             flash("Cannot waste more items than available", "danger")
@@ -1322,7 +1726,6 @@ def handle_wastage():
         
         # Reduce quantity
         item.quantity -= quantity_wasted
-        item.updated_at = datetime.utcnow()
         
         # Log the wastage
         movement = MovementHistory(
@@ -1351,29 +1754,77 @@ def handle_wastage():
 @login_required
 def item_history(product_id):
     """Show detailed history for a specific product"""
-    product = Product.query.get_or_404(product_id)
+    product = db.session.get(Product, product_id) or abort(404)
     
-    # Get all current items for this product
+    # Get all current items for this product, with item.bag filled from the join
     current_items = Item.query.filter(
         Item.product_id == product_id,
         Item.quantity > 0
-    ).join(Bag).order_by(Item.expiry_date.asc().nullslast(), Item.size).all()
+    ).join(Bag).options(contains_eager(Item.bag)).order_by(
+        Item.expiry_date.asc().nullslast(), Item.size
+    ).all()
+    
+    # Movement history for this product, one keyset page at a time (same
+    # before/before_id cursor as the main history page) so a busy product
+    # doesn't load its whole history on every view
+    query = MovementHistory.query.filter(MovementHistory.item_name == product.name)
     
-    # Get all movement history for this product
-    movement_history = MovementHistory.query.filter(
-        MovementHistory.item_name == product.name
-    ).order_by(MovementHistory.timestamp.desc()).all()
+    # As on /history, COUNT(*) over the whole history only runs when asked for
+    exact_count = request.args.get('exact_count') == '1'
+    movement_count = query.order_by(None).count() if exact_count else None
+    
+    before = request.args.get('before', '')
+    before_id = request.args.get('before_id', type=int)
+    if before:
+        try:
+            before_dt = datetime.fromisoformat(before)
+            if before_id:
+                query = query.filter(
+                    tuple_(MovementHistory.timestamp, MovementHistory.id) < (before_dt, before_id)
+                )
+            else:
+                query = query.filter(MovementHistory.timestamp < before_dt)
+        except ValueError:
+            flash("Invalid page cursor", "warning")
+            before = ''
+    
+    # The product is already known, so its name/type aren't fetched per row
+    per_page = 100
+    rows = query.options(
+        load_only(MovementHistory.timestamp, MovementHistory.movement_type, MovementHistory.quantity,
+                  MovementHistory.item_size, MovementHistory.from_bag, MovementHistory.to_bag,
+                  MovementHistory.patient_name, MovementHistory.expiry_date, MovementHistory.notes)
+    ).order_by(MovementHistory.timestamp.desc(), MovementHistory.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    movement_history = rows[:per_page]
+    
+    # A first page with no next page already holds the whole history
+    if movement_count is None and not before and not has_next:
+        movement_count = len(movement_history)
+    
+    next_page_args = None
+    if has_next:
+        next_page_args = dict(product_id=product_id,
+                              before=movement_history[-1].timestamp.isoformat(),
+                              before_id=movement_history[-1].id)
+        if exact_count:
+            next_page_args['exact_count'] = '1'
     
     return render_template('item_history.html',
                          product=product,
                          current_items=current_items,
-                         movement_history=movement_history)
+                         movement_history=movement_history,
+                         movement_count=movement_count,
+                         per_page=per_page,
+                         has_next=has_next,
+                         next_page_args=next_page_args,
+                         is_first_page=not before)
 
 @app.route('/individual_item_history/<int:item_id>')
 @login_required
 def individual_item_history(item_id):
     """Show detailed history for a specific individual item"""
-    item = Item.query.get_or_404(item_id)
+    item = db.session.get(Item, item_id, options=[joinedload(Item.bag)]) or abort(404)
     
     # Get or create the product this item belongs to
     product = item.product
@@ -1389,7 +1840,9 @@ def individual_item_history(item_id):
         db.session.commit()
     
     # Get movement history specifically for this individual item
-    # We'll match by name, type, size, and expiry date to track this specific item
+    # We'll match by name, type, size, and expiry date to track this specific item.
+    # Only the newest rows are shown, so a long-lived item can't pull its
+    # whole history into one page
     movements = MovementHistory.query.filter(
         db.and_(
             MovementHistory.item_name == item.name,
@@ -1397,7 +1850,13 @@ def individual_item_history(item_id):
             MovementHistory.item_size == item.size,
             MovementHistory.expiry_date == item.expiry_date
         )
-    ).order_by(MovementHistory.timestamp.desc()).all()
+    ).options(
+        load_only(MovementHistory.timestamp, MovementHistory.movement_type, MovementHistory.quantity,
+                  MovementHistory.item_size, MovementHistory.from_bag, MovementHistory.to_bag,
+                  MovementHistory.patient_name, MovementHistory.expiry_date, MovementHistory.notes)
+    ).order_by(
+        MovementHistory.timestamp.desc(), MovementHistory.id.desc()
+    ).limit(ITEM_HISTORY_LIMIT).all()
     
     # Get all bags for transfer functionality
     bags = Bag.query.order_by(Bag.name).all()
@@ -1416,7 +1875,7 @@ def api_check_existing_product():
     if not name:
         return jsonify({'exists': False})
     
-    product = Product.query.filter_by(name=name).first()
+    product = cached_product_by_name(name)
     return jsonify({
         'exists': product is not None,
         'product_id': product.id if product else None,
@@ -1424,54 +1883,73 @@ def api_check_existing_product():
         'minimum_stock': product.minimum_stock if product else None
     })
 
+# Autocomplete result columns as JSON-ready values; rows come back as plain
+# mappings, so no ORM entities or per-row dict building are involved
+AUTOCOMPLETE_ITEM_COLUMNS = (
+    Item.name.label('name'),
+    Item.type.label('type'),
+    func.coalesce(Item.brand, '').label('brand'),
+    func.coalesce(Item.size, '').label('size')
+)
+
 @app.route('/api/items/search')
 @login_required
 def api_search_items():
     """API endpoint for item name autocomplete"""
-    query = request.args.get('q', '').strip()
+    # Names are matched on their first MAX_SEARCH_QUERY_LENGTH characters;
+    # anything longer only makes the patterns more expensive
+    query = request.args.get('q', '').strip()[:MAX_SEARCH_QUERY_LENGTH]
     if not query or len(query) < 2:
-        return jsonify([])
+        return fast_jsonify([])
     
-    # Search in current inventory (search by name or generic name)
-    items = db.session.query(Item.name, Item.type, Item.brand, Item.size, Item.generic_name).filter(
+    # Matching is case-insensitive, so typing the same prefix again (or in a
+    # different case) is answered from the cache until the next commit
+    return fast_jsonify(cached_form_data(
+        ('autocomplete', query.lower()), lambda: search_item_suggestions(query)
+    ))
+
+def search_item_suggestions(query):
+    """Up to 10 distinct (name, type, brand, size) suggestions for query as dicts"""
+    # Fast path: single-word queries are usually a name prefix, which the
+    # lower(name) index answers without scanning for '%q%' matches. Built as a
+    # lambda_stmt so the statement itself is cached and only the pattern
+    # changes per keystroke.
+    if not any(ch.isspace() for ch in query):
+        prefix_pattern = like_escape(query.lower()) + '%'
+        prefix_items = db.session.execute(lambda_stmt(
+            lambda: select(*AUTOCOMPLETE_ITEM_COLUMNS).where(
+                func.lower(Item.name).like(prefix_pattern, escape='\\')
+            ).distinct().limit(10)
+        )).mappings().all()
+        
+        if len(prefix_items) >= 10:
+            return [dict(item) for item in prefix_items]
+    
+    # Current inventory (by name or generic name) and movement history in one
+    # UNION ALL; the outer GROUP BY dedupes and keeps inventory matches first
+    pattern = f'%{like_escape(query)}%'
+    inventory_matches = select(*AUTOCOMPLETE_ITEM_COLUMNS, literal(0).label('source')).where(
         db.or_(
-            Item.name.ilike(f'%{query}%'),
-            Item.generic_name.ilike(f'%{query}%')
+            name_matches(Item.name, query),
+            Item.generic_name.ilike(pattern, escape='\\')
         )
-    ).distinct().limit(10).all()
-    
-    # Search in movement history for historical items
-    history_items = db.session.query(MovementHistory.item_name, MovementHistory.item_type, MovementHistory.item_size).filter(
-        MovementHistory.item_name.ilike(f'%{query}%')
-    ).distinct().limit(10).all()
-    
-    # Combine and deduplicate results
-    results = []
-    seen = set()
-    
-    for item in items:
-        key = (item.name, item.type, item.brand, item.size)
-        if key not in seen:
-            results.append({
-                'name': item.name,
-                'type': item.type,
-                'brand': item.brand or '',
-                'size': item.size or ''
-            })
-            seen.add(key)
-    
-    for item in history_items:
-        key = (item.item_name, item.item_type, '', item.item_size)
-        if key not in seen:
-            results.append({
-                'name': item.item_name,
-                'type': item.item_type,
-                'brand': '',
-                'size': item.item_size or ''
-            })
-            seen.add(key)
-    
-    return jsonify(results[:10])
+    )
+    history_matches = select(
+        MovementHistory.item_name,
+        MovementHistory.item_type,
+        literal(''),
+        func.coalesce(MovementHistory.item_size, ''),
+        literal(1)
+    ).where(name_matches(MovementHistory.item_name, query))
+    
+    matches = inventory_matches.union_all(history_matches).subquery()
+    results = db.session.execute(
+        select(matches.c.name, matches.c.type, matches.c.brand, matches.c.size).group_by(
+            matches.c.name, matches.c.type, matches.c.brand, matches.c.size
+        ).order_by(func.min(matches.c.source), matches.c.name).limit(10)
+    ).mappings().all()
+    
+    return [dict(item) for item in results]
 
 @app.route('/api/update_minimum_stock', methods=['POST'])
 @login_required
@@ -1488,7 +1966,7 @@ def update_minimum_stock():
         if minimum_stock < 0:
             return jsonify({'success': False, 'error': 'Minimum stock cannot be negative'})
         
-        product = Product.query.get(product_id)
+        product = db.session.get(Product, product_id)
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'})
         
@@ -1505,38 +1983,35 @@ def update_minimum_stock():
 @login_required
 def bag_minimums():
     """Display and manage minimum quantities for each bag"""
-    bags = Bag.query.all()
+    bags = Bag.query.options(selectinload(Bag.minimums)).all()
     products = Product.query.order_by(Product.name).all()
     
     # Get all existing minimums
-    minimums = BagMinimum.query.all()
     minimums_dict = {}
-    for minimum in minimums:
-        key = f"{minimum.bag_id}_{minimum.product_id}"
-        minimums_dict[key] = minimum
-    
-    # Get bags that need restocking
-    low_stock_bags = []
     for bag in bags:
-        bag_low_items = []
         for minimum in bag.minimums:
-            if minimum.is_below_minimum():
-                bag_low_items.append({
-                    'product': minimum.product,
-                    'current': minimum.current_quantity(),
-                    'minimum': minimum.minimum_quantity,
-                    'shortage': minimum.shortage_amount()
-                })
-        if bag_low_items:
-            low_stock_bags.append({
-                'bag': bag,
-                'low_items': bag_low_items
-            })
+            key = f"{minimum.bag_id}_{minimum.product_id}"
+            minimums_dict[key] = minimum
+    
+    # Stock per (bag, product) in one GROUP BY, so the grid doesn't run
+    # current_quantity for every cell; per-bag totals fall out of the same rows
+    current_quantities = {}
+    bag_totals = {}
+    for bag_id, product_id, quantity in db.session.query(
+        Item.bag_id, Item.product_id, func.sum(Item.quantity)
+    ).filter(Item.quantity > 0).group_by(Item.bag_id, Item.product_id).all():
+        current_quantities[(bag_id, product_id)] = quantity
+        bag_totals[bag_id] = bag_totals.get(bag_id, 0) + quantity
+    
+    # Get bags that need restocking
+    low_stock_bags = bags_below_minimum(bags)
     
     return render_template('bag_minimums.html', 
                          bags=bags, 
                          products=products, 
                          minimums_dict=minimums_dict,
+                         current_quantities=current_quantities,
+                         bag_totals=bag_totals,
                          low_stock_bags=low_stock_bags)
 
 @app.route('/api/update_bag_minimum', methods=['POST'])
@@ -1554,26 +2029,41 @@ def update_bag_minimum():
         
         minimum_quantity = int(minimum_quantity)
         
-        # Check if minimum already exists
-        existing = BagMinimum.query.filter_by(bag_id=bag_id, product_id=product_id).first()
+        minimum_filter = and_(BagMinimum.bag_id == bag_id, BagMinimum.product_id == product_id)
         
         if minimum_quantity == 0:
             # Remove minimum if set to 0
-            if existing:
-                db.session.delete(existing)
-                db.session.commit()
+            db.session.execute(delete(BagMinimum).where(minimum_filter))
+            db.session.commit()
             return jsonify({'success': True, 'message': 'Minimum removed'})
         
-        if existing:
-            existing.minimum_quantity = minimum_quantity
-            existing.updated_at = datetime.utcnow()
-        else:
-            new_minimum = BagMinimum(
+        now = datetime.utcnow()
+        upsert_insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+        if upsert_insert is not None:
+            # INSERT ... ON CONFLICT (bag_id, product_id) DO UPDATE: one atomic
+            # round trip, so two people saving the same cell can't both insert
+            stmt = upsert_insert(BagMinimum).values(
                 bag_id=bag_id,
                 product_id=product_id,
-                minimum_quantity=minimum_quantity
+                minimum_quantity=minimum_quantity,
+                created_at=now,
+                updated_at=now
             )
-            db.session.add(new_minimum)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['bag_id', 'product_id'],
+                set_={'minimum_quantity': stmt.excluded.minimum_quantity, 'updated_at': now}
+            ))
+        else:
+            existing = BagMinimum.query.filter(minimum_filter).first()
+            if existing:
+                existing.minimum_quantity = minimum_quantity
+                existing.updated_at = now
+            else:
+                db.session.add(BagMinimum(
+                    bag_id=bag_id,
+                    product_id=product_id,
+                    minimum_quantity=minimum_quantity
+                ))
         
         db.session.commit()
         return jsonify({'success': True, 'message': 'Minimum updated successfully'})
@@ -1597,7 +2087,8 @@ def undo_last_action():
             return jsonify({'success': False, 'error': 'No actions to undo'})
         
         # Parse the action data
-        action_data = json.loads(last_action.action_data)
+        action_data = loads_json(last_action.action_data)
+        now = datetime.utcnow()
         
         if last_action.action_type == 'delete_bag':
             # Recreate the deleted bag
@@ -1609,44 +2100,42 @@ def undo_last_action():
             db.session.add(new_bag)
             db.session.flush()  # Get the new bag ID
             
-            # Transfer items back to the recreated bag
-            for item_data in action_data['transferred_items']:
-                item = Item.query.get(item_data['item_id'])
-                if item:
-                    item.bag_id = new_bag.id
-            
-            # Recreate bag minimums
-            for minimum_data in action_data['deleted_minimums']:
-                new_minimum = BagMinimum(
-                    bag_id=new_bag.id,
-                    product_id=minimum_data['product_id'],
-                    minimum_quantity=minimum_data['minimum_quantity']
-                )
-                db.session.add(new_minimum)
+            # Transfer items back to the recreated bag with one UPDATE
+            item_ids = [item_data['item_id'] for item_data in action_data['transferred_items']]
+            if item_ids:
+                Item.query.filter(Item.id.in_(item_ids)).update({
+                    'bag_id': new_bag.id,
+                    'updated_at': now,
+                    'version_id': Item.version_id + 1
+                })
+            
+            # Recreate bag minimums in one multi-row INSERT
+            if action_data['deleted_minimums']:
+                db.session.bulk_save_objects([
+                    BagMinimum(
+                        bag_id=new_bag.id,
+                        product_id=minimum_data['product_id'],
+                        minimum_quantity=minimum_data['minimum_quantity']
+                    ) for minimum_data in action_data['deleted_minimums']
+                ])
             
             # Mark the permanent deletion as restored
-            permanent_deletion = PermanentDeletion.query.filter_by(
-                entity_type='bag',
-                entity_name=action_data['bag_name'],
-                user_id=current_user.id,
-                is_restored=False
-            ).first()
-            if permanent_deletion:
-                permanent_deletion.is_restored = True
+            mark_deletion_restored('bag', action_data['bag_name'])
             
             # Remove the auto-transfer movement history entries
             MovementHistory.query.filter_by(
                 from_bag=action_data['bag_name'],
                 to_bag='Cabinet',
                 notes='Auto-transferred due to bag deletion'
-            ).delete()
+            ).delete(synchronize_session=False)
             
             success_message = f"Restored bag '{action_data['bag_name']}' with all items and settings"
         
         elif last_action.action_type == 'transfer':
-            # Reverse the transfer
-            from_bag = Bag.query.get(action_data['from_bag_id'])
-            to_bag = Bag.query.get(action_data['to_bag_id'])
+            # Reverse the transfer. Bag names are stored with the action (older
+            # actions only have the ids, so look those up)
+            from_bag_name = action_data.get('from_bag_name') or db.session.get(Bag, action_data['from_bag_id']).name
+            to_bag_name = action_data.get('to_bag_name') or db.session.get(Bag, action_data['to_bag_id']).name
             
             if action_data['new_item_created']:
                 # Delete the item that was created in destination bag
@@ -1658,7 +2147,7 @@ def undo_last_action():
                     db.session.delete(dest_item)
             else:
                 # Reduce quantity from existing item in destination bag
-                dest_item = Item.query.get(action_data['existing_item_id'])
+                dest_item = db.session.get(Item, action_data['existing_item_id'])
                 if dest_item:
                     dest_item.quantity -= action_data['quantity']
                     if dest_item.quantity <= 0:
@@ -1684,23 +2173,23 @@ def undo_last_action():
                 db.session.add(restored_item)
             else:
                 # Restore quantity to existing source item
-                source_item = Item.query.get(action_data['item_id'])
+                source_item = db.session.get(Item, action_data['item_id'])
                 if source_item:
                     source_item.quantity += action_data['quantity']
-                    source_item.updated_at = datetime.utcnow()
+                    source_item.updated_at = now
             
             # Remove the transfer movement history
             MovementHistory.query.filter(
                 and_(
                     MovementHistory.item_name == action_data['item_name'],
-                    MovementHistory.from_bag == from_bag.name,
-                    MovementHistory.to_bag == to_bag.name,
+                    MovementHistory.from_bag == from_bag_name,
+                    MovementHistory.to_bag == to_bag_name,
                     MovementHistory.quantity == action_data['quantity'],
                     MovementHistory.movement_type == 'transfer'
                 )
-            ).delete()
+            ).delete(synchronize_session=False)
             
-            success_message = f"Reversed transfer of {action_data['quantity']} {action_data['item_name']} from {to_bag.name} back to {from_bag.name}"
+            success_message = f"Reversed transfer of {action_data['quantity']} {action_data['item_name']} from {to_bag_name} back to {from_bag_name}"
         
         elif last_action.action_type == 'multi_transfer':
             # Reverse the multi-transfer
@@ -1709,12 +2198,12 @@ def undo_last_action():
             transfers = action_data['transfers']
             
             # Find the destination bag
-            to_bag = Bag.query.get(to_bag_id)
+            to_bag = db.session.get(Bag, to_bag_id)
             if not to_bag:
                 return jsonify({'success': False, 'error': 'Destination bag not found'})
             
             # Find Cabinet (source for multi-transfers)
-            cabinet = Bag.query.filter_by(name='Cabinet').first()
+            cabinet = get_cabinet()
             if not cabinet:
                 return jsonify({'success': False, 'error': 'Cabinet not found'})
             
@@ -1737,7 +2226,7 @@ def undo_last_action():
                     else:
                         # Reduce the quantity
                         dest_item.quantity -= quantity
-                        dest_item.updated_at = datetime.utcnow()
+                        dest_item.updated_at = now
                 
                 # Find existing item in Cabinet to restore quantity
                 cabinet_item = Item.query.filter_by(
@@ -1748,7 +2237,7 @@ def undo_last_action():
                 if cabinet_item:
                     # Add quantity back to existing Cabinet item
                     cabinet_item.quantity += quantity
-                    cabinet_item.updated_at = datetime.utcnow()
+                    cabinet_item.updated_at = now
                 else:
                     # Need to recreate the item in Cabinet
                     # Use the destination item's properties as reference
@@ -1775,7 +2264,7 @@ def undo_last_action():
                         MovementHistory.quantity == quantity,
                         MovementHistory.movement_type == 'transfer'
                     )
-                ).delete()
+                ).delete(synchronize_session=False)
                 
                 reversed_items.append(f"{quantity} {item_name}")
             
@@ -1783,11 +2272,11 @@ def undo_last_action():
         
         elif last_action.action_type == 'usage':
             # Reverse the usage
-            item = Item.query.get(action_data['item_id'])
+            item = db.session.get(Item, action_data['item_id'])
             if item:
                 # Restore the used quantity
                 item.quantity += action_data['quantity']
-                item.updated_at = datetime.utcnow()
+                item.updated_at = now
                 
                 # Remove the usage movement history
                 MovementHistory.query.filter(
@@ -1798,7 +2287,7 @@ def undo_last_action():
                         MovementHistory.movement_type == 'usage',
                         MovementHistory.patient_name == action_data['patient_name']
                     )
-                ).delete()
+                ).delete(synchronize_session=False)
                 
                 success_message = f"Reversed usage of {action_data['quantity']} {action_data['item_name']} for patient {action_data['patient_name']}"
             else:
@@ -1829,13 +2318,15 @@ def undo_last_action():
                         MovementHistory.movement_type == 'addition',
                         MovementHistory.notes == 'Added manually'
                     )
-                ).delete()
+                ).delete(synchronize_session=False)
                 
                 # If a product was created for this item and no other items use it, remove it
                 if action_data.get('product_created') and action_data.get('product_id'):
-                    other_items = Item.query.filter_by(product_id=action_data['product_id']).count()
-                    if other_items == 0:  # No other items use this product
-                        product = Product.query.get(action_data['product_id'])
+                    other_items = db.session.query(
+                        Item.query.filter_by(product_id=action_data['product_id']).exists()
+                    ).scalar()
+                    if not other_items:  # No other items use this product
+                        product = db.session.get(Product, action_data['product_id'])
                         if product:
                             db.session.delete(product)
                 
@@ -1847,43 +2338,75 @@ def undo_last_action():
             # Reverse inventory audit changes
             audit_id = action_data['audit_id']
             changes = action_data['changes']
+            audit = db.session.get(InventoryAudit, audit_id)
+            # The audit only adjusted its own bag's stock; actions recorded
+            # before the bag was stored fall back to the audit record
+            bag_id = action_data.get('bag_id', audit.bag_id if audit else None)
+            
+            # Load the items of every changed (name, type) in one query and
+            # group them by (name, type, size) rather than querying per change.
+            # As in the audit itself, plain rows are enough: the reversed
+            # quantities are worked out in memory and written back in one
+            # bulk UPDATE below.
+            rows_by_key = {}
+            versions = {}
+            name_types = list({(change['item_name'], change['item_type']) for change in changes})
+            if name_types:
+                stock_query = db.session.query(
+                    Item.id, Item.name, Item.type, Item.size, Item.quantity, Item.version_id
+                ).filter(
+                    tuple_(Item.name, Item.type).in_(name_types),
+                    Item.quantity >= 0
+                )
+                if bag_id:
+                    stock_query = stock_query.filter(Item.bag_id == bag_id)
+                for row in stock_query.order_by(Item.id).all():
+                    # NULL and '' sizes share an audit line, as in the audit
+                    rows_by_key.setdefault((row.name, row.type, row.size or None), []).append(row)
+                    versions[row.id] = row.version_id
+            
+            # New quantity per item id, starting from the stock just read
+            new_quantities = {}
             
             # Reverse each change made during the audit
             for change in changes:
-                item_name = change['item_name']
-                item_type = change['item_type']
-                item_size = change['item_size']
                 quantity_change = change['quantity_change']
                 
-                # Find items to reverse the change
-                items_to_update = Item.query.filter(
-                    and_(
-                        Item.name == item_name,
-                        Item.type == item_type,
-                        Item.size == item_size if item_size else Item.size.is_(None),
-                        Item.quantity >= 0
-                    )
-                ).all()
+                # Find items to reverse the change (an empty size matches NULL)
+                items_to_update = rows_by_key.get(
+                    (change['item_name'], change['item_type'], change['item_size'] or None), []
+                )
                 
                 if quantity_change < 0:
                     # Original was reduction (usage), so we need to add back
                     quantity_to_add = abs(quantity_change)
                     if items_to_update:
-                        items_to_update[0].quantity += quantity_to_add
+                        row = items_to_update[0]
+                        new_quantities[row.id] = new_quantities.get(row.id, row.quantity) + quantity_to_add
                 else:
                     # Original was addition (adjustment), so we need to subtract
                     remaining_to_reduce = quantity_change
-                    for item in items_to_update:
+                    for row in items_to_update:
                         if remaining_to_reduce <= 0:
                             break
                         
-                        if item.quantity <= remaining_to_reduce:
-                            remaining_to_reduce -= item.quantity
-                            item.quantity = 0
+                        quantity = new_quantities.get(row.id, row.quantity)
+                        if quantity <= remaining_to_reduce:
+                            remaining_to_reduce -= quantity
+                            new_quantities[row.id] = 0
                         else:
-                            item.quantity -= remaining_to_reduce
+                            new_quantities[row.id] = quantity - remaining_to_reduce
                             remaining_to_reduce = 0
             
+            # One executemany UPDATE by primary key, checked against the
+            # versions read above
+            if new_quantities:
+                db.session.bulk_update_mappings(Item, [
+                    {'id': item_id, 'quantity': quantity, 'updated_at': now,
+                     'version_id': versions[item_id]}
+                    for item_id, quantity in new_quantities.items()
+                ])
+            
             # Remove the audit movement history records
             MovementHistory.query.filter(
                 MovementHistory.movement_type.like('BULK_WEEKLY_CHECK_%')
@@ -1892,7 +2415,6 @@ def undo_last_action():
             ).delete(synchronize_session=False)
             
             # Mark the audit as reversed
-            audit = InventoryAudit.query.get(audit_id)
             if audit:
                 audit.notes = f"{audit.notes} - REVERSED"
             
@@ -1913,19 +2435,12 @@ def undo_last_action():
                 bag_id=item_data['bag_id'],
                 product_id=item_data.get('product_id'),
                 generic_name=item_data.get('generic_name'),
-                date_added=datetime.fromisoformat(item_data['date_added']) if item_data.get('date_added') else datetime.utcnow()
+                date_added=datetime.fromisoformat(item_data['date_added']) if item_data.get('date_added') else now
             )
             db.session.add(restored_item)
             
             # Mark the permanent deletion as restored
-            permanent_deletion = PermanentDeletion.query.filter_by(
-                entity_type='item',
-                entity_name=f"{item_data['name']} ({item_data['quantity']} units)",
-                user_id=current_user.id,
-                is_restored=False
-            ).first()
-            if permanent_deletion:
-                permanent_deletion.is_restored = True
+            mark_deletion_restored('item', f"{item_data['name']} ({item_data['quantity']} units)")
             
             # Remove the deletion movement history
             MovementHistory.query.filter(
@@ -1935,7 +2450,7 @@ def undo_last_action():
                     MovementHistory.quantity == item_data['quantity'],
                     MovementHistory.movement_type == 'deletion'
                 )
-            ).delete()
+            ).delete(synchronize_session=False)
             
             success_message = f"Restored deleted item: {item_data['name']} ({item_data['quantity']} units to {item_data['bag_name']})"
         
@@ -1946,6 +2461,9 @@ def undo_last_action():
         last_action.is_used = True
         db.session.commit()
         
+        if last_action.action_type == 'delete_bag':
+            invalidate_form_cache('bags')
+        
         return jsonify({
             'success': True, 
             'message': success_message,
@@ -1966,52 +2484,68 @@ def quick_restock_data():
             return jsonify({'items': []})
         
         # Find specified bag and Cabinet
-        target_bag = Bag.query.get(bag_id)
-        cabinet = Bag.query.filter_by(name='Cabinet').first()
+        target_bag = db.session.get(Bag, bag_id)
+        cabinet = get_cabinet()
         
         if not target_bag or not cabinet:
             return jsonify({'items': []})
         
-        # Get items that are below minimum in specified bag
+        # Minimums below stock in the bag with their current quantity, selected
+        # through the current_quantity SQL expression in the same statement
+        # rather than a query per minimum
+        below_minimum_rows = db.session.query(
+            BagMinimum, BagMinimum.current_quantity.label('current')
+        ).filter(
+            BagMinimum.bag_id == target_bag.id,
+            BagMinimum.current_quantity < BagMinimum.minimum_quantity
+        ).options(selectinload(BagMinimum.product)).order_by(BagMinimum.id).all()
+        
+        # Cabinet stock for all of those products in one query, earliest expiry first
+        product_ids = [minimum.product_id for minimum, _ in below_minimum_rows]
+        cabinet_items_by_product = {}
+        if product_ids:
+            cabinet_items = Item.query.filter(
+                Item.bag_id == cabinet.id,
+                Item.product_id.in_(product_ids),
+                Item.quantity > 0
+            ).order_by(Item.product_id, Item.expiry_date.asc().nullslast()).all()
+            cabinet_items_by_product = {
+                product_id: list(group)
+                for product_id, group in groupby(cabinet_items, key=lambda item: item.product_id)
+            }
+        
         restock_items = []
-        for minimum in target_bag.minimums:
-            current_qty = minimum.current_quantity()
-            if current_qty < minimum.minimum_quantity:
-                # Get available items in Cabinet for this product, sorted by expiry date
-                cabinet_items = Item.query.filter_by(
-                    bag_id=cabinet.id, 
-                    product_id=minimum.product_id
-                ).filter(Item.quantity > 0).order_by(Item.expiry_date.asc().nullslast()).all()
-                
-                cabinet_qty = sum(item.quantity for item in cabinet_items)
-                needed = minimum.minimum_quantity - current_qty
-                
-                # Get product details for display
-                product = minimum.product
-                size = None
-                earliest_expiry = None
-                
-                if cabinet_items:
-                    size = cabinet_items[0].size
-                    earliest_expiry = cabinet_items[0].expiry_date
-                
-                restock_items.append({
-                    'product_id': product.id,
-                    'product_name': product.name,
-                    'size': size,
-                    'cabinet_qty': cabinet_qty,
-                    'current_qty': current_qty,
-                    'minimum_qty': minimum.minimum_quantity,
-                    'needed': needed,
-                    'earliest_expiry': earliest_expiry,
-                    'cabinet_items_details': [
-                        {
-                            'quantity': item.quantity,
-                            'expiry_date': item.expiry_date,
-                            'brand': item.brand
-                        } for item in cabinet_items
-                    ]
-                })
+        for minimum, current in below_minimum_rows:
+            cabinet_items = cabinet_items_by_product.get(minimum.product_id, [])
+            cabinet_qty = sum(item.quantity for item in cabinet_items)
+            needed = minimum.minimum_quantity - current
+            
+            # Get product details for display
+            product = minimum.product
+            size = None
+            earliest_expiry = None
+            
+            if cabinet_items:
+                size = cabinet_items[0].size
+                earliest_expiry = cabinet_items[0].expiry_date
+            
+            restock_items.append({
+                'product_id': product.id,
+                'product_name': product.name,
+                'size': size,
+                'cabinet_qty': cabinet_qty,
+                'current_qty': current,
+                'minimum_qty': minimum.minimum_quantity,
+                'needed': needed,
+                'earliest_expiry': earliest_expiry,
+                'cabinet_items_details': [
+                    {
+                        'quantity': item.quantity,
+                        'expiry_date': item.expiry_date,
+                        'brand': item.brand
+                    } for item in cabinet_items
+                ]
+            })
         
         return jsonify({'items': restock_items})
         
@@ -2032,29 +2566,36 @@ def quick_restock():
             return redirect(url_for('dashboard'))
         
         # Find target bag and Cabinet
-        target_bag = Bag.query.get(bag_id)
-        cabinet = Bag.query.filter_by(name='Cabinet').first()
+        target_bag = db.session.get(Bag, bag_id)
+        cabinet = get_cabinet()
         
         if not target_bag or not cabinet:
             flash("Target bag or Cabinet not found", "danger")
             return redirect(url_for('dashboard'))
         
         transfers_made = []
+        movements = []
         
         for i, product_id in enumerate(product_ids):
             if i < len(quantities):
                 quantity = int(quantities[i]) if quantities[i].strip() else 0
                 
                 if quantity > 0:
-                    product = Product.query.get(product_id)
+                    product = db.session.get(Product, product_id)
                     if not product:
                         continue
                     
-                    # Find items in Cabinet for this product
-                    cabinet_items = Item.query.filter_by(
-                        bag_id=cabinet.id,
-                        product_id=product_id,
-                    ).filter(Item.quantity > 0).all()
+                    # Find items in Cabinet for this product. The same lookup
+                    # runs for every restocked product, so it is a lambda_stmt
+                    # compiled once with only the ids re-bound
+                    cabinet_id = cabinet.id
+                    cabinet_items = db.session.execute(lambda_stmt(
+                        lambda: select(Item).where(
+                            Item.bag_id == cabinet_id,
+                            Item.product_id == product_id,
+                            Item.quantity > 0
+                        )
+                    )).scalars().all()
                     
                     # Transfer items from Cabinet to DOC Bag 1
                     remaining_to_transfer = quantity
@@ -2065,41 +2606,14 @@ def quick_restock():
                         
                         transfer_qty = min(remaining_to_transfer, cabinet_item.quantity)
                         
-                        # Check if same item exists in target bag
-                        existing_item = Item.query.filter_by(
-                            name=cabinet_item.name,
-                            type=cabinet_item.type,
-                            size=cabinet_item.size,
-                            expiry_date=cabinet_item.expiry_date,
-                            brand=cabinet_item.brand,
-                            bag_id=target_bag.id,
-                            product_id=product_id
-                        ).first()
-                        
-                        if existing_item:
-                            # Add to existing item
-                            existing_item.quantity += transfer_qty
-                            existing_item.updated_at = datetime.utcnow()
-                        else:
-                            # Create new item in target bag
-                            new_item = Item(
-                                name=cabinet_item.name,
-                                type=cabinet_item.type,
-                                brand=cabinet_item.brand,
-                                size=cabinet_item.size,
-                                quantity=transfer_qty,
-                                expiry_date=cabinet_item.expiry_date,
-                                bag_id=target_bag.id,
-                                product_id=product_id
-                            )
-                            db.session.add(new_item)
+                        # Add to the same item (and product) in the target bag, or create it there
+                        merge_into_bag(cabinet_item, target_bag.id, transfer_qty, match_product=True)
                         
                         # Reduce quantity from Cabinet
                         cabinet_item.quantity -= transfer_qty
-                        cabinet_item.updated_at = datetime.utcnow()
                         
-                        # Log the transfer
-                        movement = MovementHistory(
+                        # Log the transfer (written in bulk below)
+                        movements.append(MovementHistory(
                             item_name=cabinet_item.name,
                             item_type=cabinet_item.type,
                             item_size=cabinet_item.size,
@@ -2109,12 +2623,14 @@ def quick_restock():
                             to_bag=target_bag.name,
                             notes=f"Quick restock transfer",
                             user_id=current_user.id
-                        )
-                        db.session.add(movement)
+                        ))
                         
                         remaining_to_transfer -= transfer_qty
                         transfers_made.append(f"{transfer_qty} {cabinet_item.name}")
         
+        if movements:
+            db.session.bulk_save_objects(movements)
+        
         db.session.commit()
         
         if transfers_made:
@@ -2140,7 +2656,11 @@ def bulk_update_bag_minimums():
             return jsonify({'success': False, 'error': 'No changes provided'})
         
         updates_count = 0
+        now = datetime.utcnow()
         
+        # Latest requested minimum per (bag, product); zero means remove it
+        upserts = {}
+        removals = set()
         for change in changes:
             bag_id = change.get('bag_id')
             product_id = change.get('product_id')
@@ -2149,29 +2669,52 @@ def bulk_update_bag_minimums():
             if not bag_id or not product_id:
                 continue
             
-            # Find existing minimum or create new one
-            existing_minimum = BagMinimum.query.filter_by(
-                bag_id=bag_id, 
-                product_id=product_id
-            ).first()
-            
+            key = (int(bag_id), int(product_id))
             if minimum_quantity > 0:
-                if existing_minimum:
-                    existing_minimum.minimum_quantity = minimum_quantity
-                    existing_minimum.updated_at = datetime.utcnow()
-                else:
-                    new_minimum = BagMinimum(
-                        bag_id=bag_id,
-                        product_id=product_id,
-                        minimum_quantity=minimum_quantity
-                    )
-                    db.session.add(new_minimum)
-                updates_count += 1
+                upserts[key] = minimum_quantity
+                removals.discard(key)
+            else:
+                removals.add(key)
+                upserts.pop(key, None)
+        
+        # Remove every cleared minimum with one DELETE
+        if removals:
+            updates_count += db.session.execute(delete(BagMinimum).where(
+                tuple_(BagMinimum.bag_id, BagMinimum.product_id).in_(list(removals))
+            )).rowcount
+        
+        if upserts:
+            upsert_insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+            if upsert_insert is not None:
+                # One multi-row INSERT ... ON CONFLICT (bag_id, product_id) DO UPDATE
+                stmt = upsert_insert(BagMinimum).values([
+                    {'bag_id': bag_id, 'product_id': product_id, 'minimum_quantity': minimum_quantity,
+                     'created_at': now, 'updated_at': now}
+                    for (bag_id, product_id), minimum_quantity in upserts.items()
+                ])
+                db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=['bag_id', 'product_id'],
+                    set_={'minimum_quantity': stmt.excluded.minimum_quantity, 'updated_at': now}
+                ))
             else:
-                # Remove minimum if quantity is 0
-                if existing_minimum:
-                    db.session.delete(existing_minimum)
-                    updates_count += 1
+                existing_minimums = {
+                    (minimum.bag_id, minimum.product_id): minimum
+                    for minimum in BagMinimum.query.filter(
+                        tuple_(BagMinimum.bag_id, BagMinimum.product_id).in_(list(upserts))
+                    ).all()
+                }
+                for (bag_id, product_id), minimum_quantity in upserts.items():
+                    existing_minimum = existing_minimums.get((bag_id, product_id))
+                    if existing_minimum:
+                        existing_minimum.minimum_quantity = minimum_quantity
+                        existing_minimum.updated_at = now
+                    else:
+                        db.session.add(BagMinimum(
+                            bag_id=bag_id,
+                            product_id=product_id,
+                            minimum_quantity=minimum_quantity
+                        ))
+            updates_count += len(upserts)
         
         db.session.commit()
         
@@ -2189,23 +2732,30 @@ def bulk_update_bag_minimums():
 def get_last_action():
     """Get information about the last action that can be undone"""
     try:
-        last_action = UndoAction.query.filter_by(
-            user_id=current_user.id,
-            is_used=False
-        ).order_by(UndoAction.timestamp.desc()).first()
-        
-        if last_action:
-            return jsonify({
-                'action': {
-                    'description': last_action.description,
-                    'timestamp': last_action.timestamp.isoformat()
-                }
-            })
-        else:
-            return jsonify({'action': None})
+        # Polled by every open page, so answered from a short per-user cache
+        # that the next commit (a new or used undo action) drops
+        return jsonify({'action': cached_form_data(
+            ('last_action', current_user.id), load_last_action, ttl=LAST_ACTION_CACHE_TTL
+        )})
     except Exception as e:
         return jsonify({'action': None, 'error': str(e)})
 
+def load_last_action():
+    """The current user's newest unused undo action as a dict, or None"""
+    last_action = db.session.query(
+        UndoAction.description, UndoAction.timestamp
+    ).filter_by(
+        user_id=current_user.id,
+        is_used=False
+    ).order_by(UndoAction.timestamp.desc()).first()
+    
+    if not last_action:
+        return None
+    return {
+        'description': last_action.description,
+        'timestamp': last_action.timestamp.isoformat()
+    }
+
 @app.route('/inventory_audit')
 @login_required
 def inventory_audit():
@@ -2218,41 +2768,48 @@ def inventory_audit():
     
     # If no bag is selected, default to Cabinet
     if not selected_bag_id:
-        cabinet_bag = Bag.query.filter_by(name='Cabinet').first()
+        cabinet_bag = get_cabinet()
         if cabinet_bag:
             selected_bag_id = cabinet_bag.id
     
     # Get all items that require weekly check (types 4 and 5)
     consumables_audit_types = ['Consumable Dressings/Swabs', 'Catheters & Containers']
     
-    # Base query for consumable items - always filter by selected bag
-    query = Item.query.join(Bag).filter(
+    # Sum quantities per (name, size) in the database so only one row per
+    # audit line comes back instead of every individual batch. The page is
+    # always scoped to a single bag, so its name/location come from
+    # selected_bag; min(type) keeps a deterministic type should one name and
+    # size ever be stored under two types.
+    selected_bag = db.session.get(Bag, selected_bag_id) if selected_bag_id else None
+    rows = db.session.query(
+        Item.name,
+        Item.size,
+        func.min(Item.type).label('type'),
+        func.sum(Item.quantity).label('current_qty')
+    ).filter(
         and_(
             Item.type.in_(consumables_audit_types),
             Item.quantity > 0,
             Item.bag_id == selected_bag_id
         )
-    )
-    
-    selected_bag = Bag.query.get(selected_bag_id) if selected_bag_id else None
-    consumable_items = query.order_by(Item.name, Item.size).all()
+    ).group_by(Item.name, Item.size).order_by(Item.name, Item.size).all()
     
     # Group items by name and size for easier display
     grouped_items = {}
-    for item in consumable_items:
-        key = f"{item.name} ({item.size})" if item.size else item.name
-        if key not in grouped_items:
-            grouped_items[key] = {
-                'name': item.name,
-                'size': item.size,
-                'current_qty': 0,
-                'type': item.type,
-                'bag_name': item.bag.name,
-                'bag_location': item.bag.location,
-                'items': []
-            }
-        grouped_items[key]['current_qty'] += item.quantity
-        grouped_items[key]['items'].append(item)
+    for row in rows:
+        key = f"{row.name} ({row.size})" if row.size else row.name
+        if key in grouped_items:
+            # NULL and '' sizes share a display key, as they always have
+            grouped_items[key]['current_qty'] += row.current_qty
+            continue
+        grouped_items[key] = {
+            'name': row.name,
+            'size': row.size,
+            'current_qty': row.current_qty,
+            'type': row.type,
+            'bag_name': selected_bag.name,
+            'bag_location': selected_bag.location
+        }
     
     return render_template('inventory_audit.html', 
                          grouped_items=grouped_items,
@@ -2268,22 +2825,33 @@ def handle_inventory_audit():
             # Get today's date to check if it's Friday
             today = datetime.now()
             
-            # Process each item's new count
+            # Process each item's new count; every change is stamped with the
+            # same audit time
+            now = datetime.utcnow()
             bulk_movements = []
+            changes = []
             
+            # Group the count and hidden detail fields by their row key in one
+            # pass over the form
+            form_rows = {}
+            selected_bag_id = request.form.get('selected_bag_id', type=int)
             for key, value in request.form.items():
-                if key.startswith('new_count_'):
-                    item_key = key.replace('new_count_', '')
+                match = AUDIT_FIELD_RE.match(key)
+                if match:
+                    form_rows.setdefault(match.group(2), {})[match.group(1)] = value
+            
+            for fields in form_rows.values():
+                if 'new_count' in fields:
+                    value = fields['new_count']
                     new_count = int(value) if value.strip() else 0
                     
                     # Get current quantity from hidden field
-                    current_qty_key = f'current_qty_{item_key}'
-                    current_qty = int(request.form.get(current_qty_key, 0))
+                    current_qty = int(fields.get('current_qty', 0))
                     
                     # Get item details from hidden fields
-                    item_name = request.form.get(f'item_name_{item_key}', '')
-                    item_type = request.form.get(f'item_type_{item_key}', '')
-                    item_size = request.form.get(f'item_size_{item_key}', '')
+                    item_name = fields.get('item_name', '')
+                    item_type = fields.get('item_type', '')
+                    item_size = fields.get('item_size', '')
                     
                     # Calculate delta
                     delta = new_count - current_qty
@@ -2292,57 +2860,98 @@ def handle_inventory_audit():
                         # Determine movement type
                         movement_type = 'USAGE' if delta < 0 else 'ADJUSTMENT'
                         
-                        # Create movement record
-                        movement = MovementHistory(
-                            item_name=item_name,
-                            item_type=item_type,
-                            item_size=item_size,
-                            quantity=abs(delta),
-                            movement_type=f'BULK_WEEKLY_CHECK_{movement_type}',
-                            notes=f'Weekly check: {current_qty} → {new_count} (Δ{delta:+d})',
-                            timestamp=datetime.utcnow(),
-                            user_id=current_user.id
-                        )
-                        bulk_movements.append(movement)
-                        
-                        # Update actual item quantities
-                        # Find all items with this name/size combination
-                        items_to_update = Item.query.filter(
-                            and_(
-                                Item.name == item_name,
-                                Item.type == item_type,
-                                Item.size == item_size if item_size else Item.size.is_(None),
-                                Item.quantity > 0
-                            )
-                        ).all()
+                        # Movement record as a plain mapping (inserted in bulk below)
+                        bulk_movements.append({
+                            'item_name': item_name,
+                            'item_type': item_type,
+                            'item_size': item_size,
+                            'quantity': abs(delta),
+                            'movement_type': f'BULK_WEEKLY_CHECK_{movement_type}',
+                            'notes': f'Weekly check: {current_qty} → {new_count} (Δ{delta:+d})',
+                            'timestamp': now,
+                            'user_id': current_user.id
+                        })
+                        changes.append(((item_name, item_type, item_size or None), current_qty, delta))
+            
+            # Fetch the in-stock batches for every changed name/type/size in one
+            # query and group them by that key, instead of one query per line.
+            # Plain column rows are enough: the new quantities are worked out
+            # in memory and written back in a single bulk UPDATE below, which
+            # checks each row's version_id is still the one read here.
+            rows_by_key = {}
+            versions = {}
+            if changes:
+                stock_query = db.session.query(
+                    Item.id, Item.name, Item.type, Item.size, Item.quantity, Item.version_id
+                ).filter(
+                    Item.name.in_({change_key[0] for change_key, _, _ in changes}),
+                    Item.quantity > 0
+                )
+                # The audit page counts a single bag, so only that bag's stock is adjusted
+                if selected_bag_id:
+                    stock_query = stock_query.filter(Item.bag_id == selected_bag_id)
+                for row in stock_query.order_by(Item.id).all():
+                    # NULL and '' sizes share an audit line, as on the audit page
+                    rows_by_key.setdefault((row.name, row.type, row.size or None), []).append(row)
+                    versions[row.id] = row.version_id
+            
+            # Each delta is relative to the quantity shown when the page was
+            # rendered; if the stock has moved since then, applying it would
+            # overwrite that change, so reject the audit as stale instead
+            for change_key, current_qty, _ in changes:
+                if sum(row.quantity for row in rows_by_key.get(change_key, [])) != current_qty:
+                    raise StaleDataError(f'Stock for {change_key[0]} changed since the audit page was loaded')
+            
+            # New quantity per item id, starting from the stock just read
+            new_quantities = {}
+            
+            # Update actual item quantities
+            for change_key, _, delta in changes:
+                # All items with this name/size combination that still have stock
+                items_to_update = [
+                    row for row in rows_by_key.get(change_key, [])
+                    if new_quantities.get(row.id, row.quantity) > 0
+                ]
+                
+                if delta < 0:
+                    # Usage - reduce quantities
+                    remaining_to_reduce = abs(delta)
+                    for row in items_to_update:
+                        if remaining_to_reduce <= 0:
+                            break
                         
-                        if delta < 0:
-                            # Usage - reduce quantities
-                            remaining_to_reduce = abs(delta)
-                            for item in items_to_update:
-                                if remaining_to_reduce <= 0:
-                                    break
-                                
-                                if item.quantity <= remaining_to_reduce:
-                                    remaining_to_reduce -= item.quantity
-                                    item.quantity = 0
-                                else:
-                                    item.quantity -= remaining_to_reduce
-                                    remaining_to_reduce = 0
+                        quantity = new_quantities.get(row.id, row.quantity)
+                        if quantity <= remaining_to_reduce:
+                            remaining_to_reduce -= quantity
+                            new_quantities[row.id] = 0
                         else:
-                            # Adjustment - add to first available item or create new if needed
-                            if items_to_update:
-                                items_to_update[0].quantity += delta
-                            # If no items exist, we'd need to create one, but that's unusual for weekly check
-            
-            # Save all movements and item updates
-            for movement in bulk_movements:
-                db.session.add(movement)
+                            new_quantities[row.id] = quantity - remaining_to_reduce
+                            remaining_to_reduce = 0
+                else:
+                    # Adjustment - add to first available item or create new if needed
+                    if items_to_update:
+                        row = items_to_update[0]
+                        new_quantities[row.id] = new_quantities.get(row.id, row.quantity) + delta
+                    # If no items exist, we'd need to create one, but that's unusual for weekly check
+            
+            # Write every changed quantity in one executemany UPDATE by primary
+            # key rather than one ORM flush UPDATE per item
+            if new_quantities:
+                db.session.bulk_update_mappings(Item, [
+                    {'id': item_id, 'quantity': quantity, 'updated_at': now,
+                     'version_id': versions[item_id]}
+                    for item_id, quantity in new_quantities.items()
+                ])
+            
+            # Save all movements in one executemany INSERT straight from the
+            # mappings, without building MovementHistory objects
+            if bulk_movements:
+                db.session.bulk_insert_mappings(MovementHistory, bulk_movements)
             
             # Create audit record
             audit = InventoryAudit(
                 user_id=current_user.id,
-                bag_id=request.form.get('selected_bag_id', type=int),
+                bag_id=selected_bag_id,
                 items_checked=len(bulk_movements),
                 notes=f'Inventory audit completed with {len(bulk_movements)} items updated'
             )
@@ -2354,34 +2963,33 @@ def handle_inventory_audit():
                 # Store the audit changes for undo
                 audit_data = {
                     'audit_id': audit.id,
+                    'bag_id': selected_bag_id,
                     'changes': []
                 }
                 
                 # Store each change made during the audit
                 for movement in bulk_movements:
                     change_data = {
-                        'item_name': movement.item_name,
-                        'item_type': movement.item_type,
-                        'item_size': movement.item_size,
-                        'quantity_change': -movement.quantity if 'USAGE' in movement.movement_type else movement.quantity,
-                        'movement_type': movement.movement_type,
-                        'notes': movement.notes
+                        'item_name': movement['item_name'],
+                        'item_type': movement['item_type'],
+                        'item_size': movement['item_size'],
+                        'quantity_change': -movement['quantity'] if 'USAGE' in movement['movement_type'] else movement['quantity'],
+                        'movement_type': movement['movement_type'],
+                        'notes': movement['notes']
                     }
                     audit_data['changes'].append(change_data)
                 
                 # Create undo action
-                undo_action = UndoAction(
-                    action_type='inventory_audit',
-                    action_data=json.dumps(audit_data),
-                    description=f'Inventory audit with {len(bulk_movements)} item changes',
-                    user_id=current_user.id
-                )
-                db.session.add(undo_action)
+                record_undo('inventory_audit', audit_data,
+                            f'Inventory audit with {len(bulk_movements)} item changes')
             
             db.session.commit()
             
             flash(f'Inventory audit completed successfully! {len(bulk_movements)} items updated.', 'success')
             
+        except StaleDataError:
+            db.session.rollback()
+            flash('Stock changed since the audit page was loaded. Nothing was applied; please reload and submit the counts again.', 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Error processing inventory audit: {str(e)}', 'error')
@@ -2393,7 +3001,10 @@ def handle_inventory_audit():
 def update_product():
     """API endpoint to update product information"""
     try:
-        data = request.get_json()
+        # silent so a non-JSON body is a 400 here rather than a 500 with a rollback
+        data = request.get_json(silent=True, cache=False)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Invalid JSON body'}), 400
         product_id = data.get('product_id')
         field = data.get('field')
         value = data.get('value')
@@ -2401,10 +3012,8 @@ def update_product():
         if not all([product_id, field, value is not None]):
             return jsonify({'success': False, 'message': 'Missing required parameters'})
         
-        product = Product.query.get_or_404(product_id)
-        
         # Validate field
-        if field not in ['name', 'type', 'minimum_stock']:
+        if field not in PRODUCT_EDIT_FIELDS:
             return jsonify({'success': False, 'message': 'Invalid field'})
         
         # Special validation for minimum_stock
@@ -2416,92 +3025,163 @@ def update_product():
             except ValueError:
                 return jsonify({'success': False, 'message': 'Minimum stock must be a number'})
         
-        # Check if name already exists for another product
+        # Update the field with one UPDATE instead of loading the product first.
+        # Rows already holding the value are skipped, and a rename also checks,
+        # in the same statement, that no other product already has the name
+        column = getattr(Product, field)
+        product_filter = and_(Product.id == product_id, column.is_distinct_from(value))
         if field == 'name':
-            existing = Product.query.filter(Product.name == value, Product.id != product_id).first()
-            if existing:
-                return jsonify({'success': False, 'message': 'Product name already exists'})
-        
-        # Update the field
-        setattr(product, field, value)
-        
-        # Also update all related items if name or type changed
-        if field in ['name', 'type']:
-            items = Item.query.filter_by(product_id=product_id).all()
-            for item in items:
-                setattr(item, field, value)
+            other = aliased(Product)
+            product_filter = and_(product_filter, ~select(other.id).where(
+                other.name == value, other.id != product_id
+            ).exists())
+        updated = db.session.execute(
+            update(Product).where(product_filter).values({field: value})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            # Nothing matched: an unchanged value (re-sent when the editor is
+            # saved as is) or a taken name if the product exists, else a 404
+            current = db.session.execute(select(column).where(Product.id == product_id)).first()
+            db.session.rollback()
+            if current is None:
+                abort(404)
+            if current[0] == value:
+                return jsonify({'success': True, 'message': 'No change'})
+            return jsonify({'success': False, 'message': 'Product name already exists'})
+        
+        # Also update all related items if name or type changed, in one UPDATE
+        if field in PRODUCT_SHARED_FIELDS:
+            db.session.execute(
+                update(Item).where(Item.product_id == product_id)
+                .values({field: value, 'version_id': Item.version_id + 1})
+                .execution_options(synchronize_session=False)
+            )
         
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Product updated successfully'})
         
-    except Exception as e:
+    except NotFound:
         db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    except Exception:
+        db.session.rollback()
+        logger.exception('Product update failed')
+        return jsonify({'success': False, 'message': 'Internal error'}), 500
+
+def apply_item_edit(item_id, field, value):
+    """Validate and write one inline item edit in the open transaction.
+
+    Returns (success, message, changed). Nothing is committed, so a batch of
+    edits can share one commit; a missing item aborts with 404.
+    """
+    if not all([item_id, field]):
+        return False, 'Missing required parameters', False
+    
+    # Validate field
+    if field not in ITEM_EDIT_FIELDS:
+        return False, 'Invalid field', False
+    
+    # Handle empty string for optional fields
+    if field in ITEM_OPTIONAL_FIELDS and not value:
+        value = None
+    
+    # Handle expiry_date field with MM/YY format parsing (e.g., "04/26" ->
+    # April 2026, day 01), through the same cached parser as the add forms
+    if field == 'expiry_date':
+        if not value:
+            value = None
+        else:
+            try:
+                value = parse_expiry_date(value)
+            except (ValueError, TypeError):
+                return False, 'Invalid expiry date format. Use MM/YY format (e.g., 04/26)', False
+    
+    # Update the field with one UPDATE ... RETURNING instead of loading the
+    # item (and its product) first; an item already holding the value is
+    # left alone
+    column = getattr(Item, field)
+    updated = db.session.execute(
+        update(Item).where(Item.id == item_id, column.is_distinct_from(value))
+        .values({field: value, 'version_id': Item.version_id + 1})
+        .returning(Item.product_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if updated is None:
+        if not db.session.query(Item.query.filter(Item.id == item_id).exists()).scalar():
+            abort(404)
+        return True, 'No change', False
+    
+    # Update the product if name or type changed
+    if field in PRODUCT_SHARED_FIELDS and updated.product_id is not None:
+        db.session.execute(
+            update(Product).where(Product.id == updated.product_id).values({field: value})
+            .execution_options(synchronize_session=False)
+        )
+    
+    return True, 'Item updated successfully', True
 
 @app.route('/api/update-item', methods=['POST'])
 @login_required
 def update_item():
     """API endpoint to update individual item information"""
     try:
-        data = request.get_json()
-        item_id = data.get('item_id')
-        field = data.get('field')
-        value = data.get('value')
-        
-        if not all([item_id, field]):
-            return jsonify({'success': False, 'message': 'Missing required parameters'})
-        
-        item = Item.query.get_or_404(item_id)
-        
-        # Validate field
-        if field not in ['name', 'type', 'size', 'brand', 'generic_name', 'expiry_date']:
-            return jsonify({'success': False, 'message': 'Invalid field'})
-        
-        # Handle empty string for optional fields
-        if field in ['size', 'brand', 'generic_name'] and not value:
-            value = None
+        data = request.get_json(silent=True, cache=False)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Invalid JSON body'}), 400
+        success, message, changed = apply_item_edit(data.get('item_id'), data.get('field'), data.get('value'))
         
-        # Handle expiry_date field with MM/YY format parsing
-        if field == 'expiry_date':
-            if not value:
-                value = None
-            else:
-                try:
-                    # Parse MM/YY format (e.g., "04/26" -> April 2026, day 01)
-                    if '/' in value and len(value) == 5:
-                        month_str, year_str = value.split('/')
-                        month = int(month_str)
-                        year = int('20' + year_str)  # Convert YY to 20YY
-                        
-                        # Validate month
-                        if month < 1 or month > 12:
-                            return jsonify({'success': False, 'message': 'Invalid month. Use MM/YY format (01-12)'})
-                        
-                        # Create date object with day 01
-                        from datetime import date
-                        value = date(year, month, 1)
-                    else:
-                        return jsonify({'success': False, 'message': 'Invalid expiry date format. Use MM/YY format (e.g., 04/26)'})
-                except (ValueError, TypeError):
-                    return jsonify({'success': False, 'message': 'Invalid expiry date format. Use MM/YY format (e.g., 04/26)'})
+        if changed:
+            db.session.commit()
+        else:
+            db.session.rollback()
         
-        # Update the field
-        setattr(item, field, value)
+        return jsonify({'success': success, 'message': message})
         
-        # Update the product if name or type changed
-        if field in ['name', 'type'] and item.product:
-            # Check if we should update the product too
-            # Only update if this is the primary representation
-            setattr(item.product, field, value)
+    except NotFound:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    except Exception:
+        db.session.rollback()
+        logger.exception('Item update failed')
+        return jsonify({'success': False, 'message': 'Internal error'}), 500
+
+@app.route('/api/update-items', methods=['POST'])
+@login_required
+def update_items():
+    """API endpoint applying a list of [{item_id, field, value}, ...] item edits
+    with one commit; preferred over /api/update-item for bulk changes"""
+    try:
+        edits = request.get_json(silent=True, cache=False)
+        if not isinstance(edits, list) or not edits:
+            return jsonify({'success': False, 'message': 'No edits provided'}), 400
+        if len(edits) > MAX_BATCH_ITEM_EDITS:
+            return jsonify({'success': False, 'message': f'At most {MAX_BATCH_ITEM_EDITS} edits per request'}), 400
+        if not all(isinstance(edit, dict) and edit.get('item_id') and edit.get('field') for edit in edits):
+            return jsonify({'success': False, 'message': 'Each edit needs an item_id and field'}), 400
+        
+        results = []
+        any_changed = False
+        for edit in edits:
+            try:
+                success, message, changed = apply_item_edit(edit.get('item_id'), edit.get('field'), edit.get('value'))
+            except NotFound:
+                success, message, changed = False, 'Item not found', False
+            results.append({'item_id': edit.get('item_id'), 'success': success, 'message': message})
+            any_changed = any_changed or changed
         
-        db.session.commit()
+        if any_changed:
+            db.session.commit()
+        else:
+            db.session.rollback()
         
-        return jsonify({'success': True, 'message': 'Item updated successfully'})
+        return jsonify({'success': all(result['success'] for result in results), 'results': results})
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
+        logger.exception('Batched item update failed')
+        return jsonify({'success': False, 'message': 'Internal error'}), 500
 
 @app.route('/delete_item', methods=['POST'])
 @login_required
@@ -2521,7 +3201,7 @@ def delete_item():
             return redirect(request.referrer or url_for('inventory'))
         
         # Get the item to delete
-        item = Item.query.get_or_404(item_id)
+        item = db.session.get(Item, item_id) or abort(404)
         
         # Store item information for logging and undo functionality
         item_data = {
@@ -2543,7 +3223,7 @@ def delete_item():
         deletion_record = PermanentDeletion(
             entity_type='item',
             entity_name=f"{item.name} ({item.quantity} units)",
-            entity_data=json.dumps(item_data),
+            entity_data=dumps_json(item_data),
             user_id=current_user.id
         )
         db.session.add(deletion_record)
@@ -2569,13 +3249,8 @@ def delete_item():
             'notes': notes
         }
         
-        undo_action = UndoAction(
-            action_type='delete_item',
-            action_data=json.dumps(undo_data),
-            description=f"Deleted item: {item.name} ({item.quantity} units from {item.bag.name})",
-            user_id=current_user.id
-        )
-        db.session.add(undo_action)
+        record_undo('delete_item', undo_data,
+                    f"Deleted item: {item.name} ({item.quantity} units from {item.bag.name})")
         
         # Delete the item
         db.session.delete(item)
@@ -2744,7 +3419,7 @@ def handle_edit_user_from_profile():
             flash('User ID and username are required', 'danger')
             return redirect(url_for('user_profile'))
         
-        user = User.query.get_or_404(user_id)
+        user = db.session.get(User, user_id) or abort(404)
         
         # Check if username is already taken by another user
         existing_user = User.query.filter(User.username == username, User.id != user.id).first()
@@ -2783,7 +3458,7 @@ def handle_delete_user_from_profile():
             flash('User ID is required', 'danger')
             return redirect(url_for('user_profile'))
         
-        user = User.query.get_or_404(user_id)
+        user = db.session.get(User, user_id) or abort(404)
         
         # Prevent deleting yourself
         if user.id == current_user.id: